@@ -0,0 +1,322 @@
+# benchmark.py - Замеры скорости интерпретатора ZeroBasics
+#
+# python benchmark.py                       - все замеры, результат в benchmark_results.json
+# python benchmark.py --baseline=base.json  - сравнить с сохраненным результатом
+# python benchmark.py --save-baseline=base.json
+# python benchmark.py --only=calc --quick   - часть замеров, меньше повторов
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import statistics
+import subprocess
+
+from ZeroShell import ZeroShell, VERSION, parse_options
+
+# Допустимое замедление относительно базового результата
+DEFAULT_TOLERANCE = 0.20
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def make_shell(script_dir=None, native=False):
+    """Оболочка, вывод которой уходит в память, а не на экран"""
+    shell = ZeroShell()
+    shell.output.stream = io.StringIO()
+    shell.output.max_size = 1 << 20
+    shell.use_cache = False
+    shell.native = native
+    if script_dir:
+        shell.script_dir = script_dir
+    return shell
+
+def reset_output(shell):
+    shell.output.flush()
+    shell.output.stream = io.StringIO()
+
+def run_lines(shell, lines):
+    """Компилирует строки как главу main и выполняет ее"""
+    shell.chapters.clear()
+    shell.chapters["main"] = [shell.compile_line(line) for line in lines]
+    return lambda: (shell.execute_chapter("main"), reset_output(shell))
+
+# ---------------------------------------------------------------------------
+# Генераторы больших скриптов
+
+def script_many_chapters(scale):
+    """Тысячи глав, связанных переходами Run"""
+    count = 3000 * scale
+    lines = []
+    for i in range(count):
+        lines.append(f"Chp c{i}")
+        lines.append(f"$v{i % 50} = {{глава {i}}}")
+        lines.append(f"calc $i + 1 - $i")
+        lines.append(f"if $i = {{0}} - Print {{никогда}}")
+        lines.append(f"Run c{i + 1}" if i + 1 < count else "Exit")
+        lines.append("End Chp")
+    return ["Chp start", "$i = 0", "Run c0", "End Chp"] + lines
+
+def script_long_loops(scale):
+    """Длинные циклы rpl с арифметикой"""
+    return [
+        "Chp main",
+        "$i = 0",
+        "$s = 0",
+        f"rpl {20000 * scale} calc $i + 1 - $i",
+        f"rpl {20000 * scale} calc $s + $i * 2 - $s",
+        f"rpl 100 rpl {200 * scale} calc ($i % 7) + $s - $t",
+        "Print {Итог: } $i $s $t",
+        "End Chp",
+    ]
+
+def script_wide_variables(scale):
+    """Сотни переменных и строк с подстановками"""
+    width = 500 * scale
+    lines = ["Chp main"]
+    for i in range(width):
+        lines.append(f"$var{i} = значение{i}")
+    for i in range(width):
+        lines.append(f"calc {i} + 1 - $num{i}")
+    for i in range(0, width, 5):
+        lines.append(f"Print {{$var{i}}} $var{i + 1} {{-}} $num{i} $num{i + 4}")
+    lines.append("End Chp")
+    return lines
+
+def script_heavy_print(scale):
+    """Много вывода, в том числе цветного"""
+    return [
+        "Chp main",
+        "$name = ZeroBasics",
+        f"rpl {5000 * scale} Print {{Привет, }} $name {{!}}",
+        f"rpl {5000 * scale} Print Col green {{зеленый}} Col red {{красный}}",
+        f"rpl {5000 * scale} Print {{постоянная строка}}",
+        "End Chp",
+    ]
+
+MACRO_SCRIPTS = {
+    "many_chapters": script_many_chapters,
+    "long_loops": script_long_loops,
+    "wide_variables": script_wide_variables,
+    "heavy_print": script_heavy_print,
+}
+
+# ---------------------------------------------------------------------------
+# Замеры: каждая функция получает масштаб и возвращает функцию для замера
+
+def bench_tokenize(scale, workdir):
+    shell = make_shell()
+    lines = [
+        "Print {Привет, } $name {!} Nline Col green {готово}",
+        "if $choice = {да} - Print {Выбрано: } $choice",
+        "save $text in Here - {заметка $n.txt}",
+        "Input $name - {Введите имя:} L10",
+    ] * (250 * scale)
+    return lambda: [shell.compile_line(line) for line in lines]
+
+def bench_interpolation(scale, workdir):
+    shell = make_shell()
+    for i in range(50):
+        shell.variables[f"v{i}"] = f"значение {i}"
+    text = "{" + " ".join(f"текст $v{i % 50} {{вложено $v{(i * 7) % 50}}}" for i in range(200 * scale)) + "}"
+    shell.parse_text(text)
+    return lambda: [shell.parse_text(text) for _ in range(20)]
+
+def bench_calc(scale, workdir):
+    shell = make_shell()
+    for i in range(300):
+        shell.variables[f"x{i}"] = i
+    return run_lines(shell, [f"rpl {20000 * scale} calc ($x1 + $x299) * $x150 / 7 - $r"])
+
+def bench_rpl(scale, workdir):
+    shell = make_shell()
+    return run_lines(shell, ["$i = 0", f"rpl {50000 * scale} calc $i + 1 - $i"])
+
+def bench_print(scale, workdir):
+    shell = make_shell()
+    return run_lines(shell, ["$i = 7", f"rpl {20000 * scale} Print {{строка}} $i Col cyan {{цвет}}"])
+
+def bench_save(scale, workdir):
+    shell = make_shell()
+    shell.project_dir = os.path.join(workdir, "save")
+    return run_lines(shell, ["$i = 0", f"rpl {5000 * scale} append $i in Here - log.txt",
+                             f"rpl {2000 * scale} save $i in Here - state.txt"])
+
+def bench_run_loop(scale, workdir):
+    shell = make_shell()
+    shell.chapters.clear()
+    shell.chapters["main"] = [shell.compile_line(line) for line in ["$i = 0", "Run loop"]]
+    shell.chapters["loop"] = [shell.compile_line(line) for line in [
+        "calc $i + 1 - $i",
+        f"if $i = {{{20000 * scale}}} - Exit",
+        "Run loop",
+    ]]
+
+    def run():
+        shell.should_exit = False
+        shell.execute_chapter("main")
+        reset_output(shell)
+    return run
+
+def bench_if_chain(scale, workdir):
+    shell = make_shell()
+    lines = ["Chp main", "$i = 0", "Run loop", "End Chp", "Chp loop", "calc $i % 10 - $k"]
+    lines += [f"if $k = {{{k}}} - $answer = ответ {k}" for k in range(10)]
+    lines += ["calc $i + 1 - $i", f"if $i = {{{20000 * scale}}} - Exit", "Run loop", "End Chp"]
+    chapters, shell.symbols = shell.parse_script(lines)
+    shell.chapters.update(chapters)
+    
+    def run():
+        shell.should_exit = False
+        shell.execute_chapter("main")
+        reset_output(shell)
+    return run
+
+def make_macro(name, native=False):
+    def bench(scale, workdir):
+        filename = f"{name}.txt"
+        with open(os.path.join(workdir, filename), 'w', encoding='utf-8') as f:
+            f.write("\n".join(MACRO_SCRIPTS[name](scale)))
+        shell = make_shell(workdir, native)
+
+        def run():
+            shell.load_script(filename)
+            shell.execute_chapter(shell.symbols.entry)
+            reset_output(shell)
+        return run
+    return bench
+
+def bench_load_cached(scale, workdir):
+    with open(os.path.join(workdir, "cached.txt"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(script_many_chapters(scale)))
+    shell = make_shell(workdir)
+    shell.use_cache = True
+    shell.load_script("cached.txt")
+    return lambda: shell.load_script("cached.txt")
+
+# ---------------------------------------------------------------------------
+# Запуск: отдельный процесс, как при вызове из cron или CI
+
+def bench_startup_python(scale, workdir):
+    """Пустой процесс Python - нижняя граница для остальных замеров запуска"""
+    command = [sys.executable, "-c", "pass"]
+    return lambda: subprocess.run(command, check=True)
+
+def bench_startup_import(scale, workdir):
+    """Импорт модуля и создание оболочки"""
+    command = [sys.executable, "-c", "import ZeroShell; ZeroShell.ZeroShell()"]
+    return lambda: subprocess.run(command, cwd=HERE, check=True)
+
+def bench_startup_script(scale, workdir):
+    """python ZeroShell.py с коротким скриптом: импорт, загрузка, выполнение"""
+    folder = os.path.join(workdir, "startup")
+    os.makedirs(os.path.join(folder, "Scripts"), exist_ok=True)
+    with open(os.path.join(folder, "Scripts", "hello.txt"), 'w', encoding='utf-8') as f:
+        f.write("Chp main\nPrint {Привет} Col green {из cron}\nEnd Chp\n")
+    command = [sys.executable, os.path.join(HERE, "ZeroShell.py"), "hello.txt"]
+    return lambda: subprocess.run(command, cwd=folder, input=b"\n", stdout=subprocess.DEVNULL, check=True)
+
+BENCHMARKS = {
+    "micro.tokenize": bench_tokenize,
+    "micro.interpolation": bench_interpolation,
+    "micro.calc": bench_calc,
+    "micro.rpl": bench_rpl,
+    "micro.print": bench_print,
+    "micro.run_loop": bench_run_loop,
+    "micro.save": bench_save,
+    "micro.if_chain": bench_if_chain,
+    "macro.load_cached": bench_load_cached,
+    "startup.python": bench_startup_python,
+    "startup.import": bench_startup_import,
+    "startup.script": bench_startup_script,
+}
+for _name in MACRO_SCRIPTS:
+    BENCHMARKS[f"macro.{_name}"] = make_macro(_name)
+# Те же скрипты с главами, переведенными в функции Python (--native)
+for _name in MACRO_SCRIPTS:
+    BENCHMARKS[f"native.{_name}"] = make_macro(_name, native=True)
+
+# ---------------------------------------------------------------------------
+
+def measure(func, repeat):
+    """Лучшее и медианное время из repeat запусков"""
+    func()  # прогрев: кэши шаблонов и выражений
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times)
+
+def run_benchmarks(only=None, quick=False):
+    scale = 1
+    repeat = 2 if quick else 5
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="zb_bench_")
+    try:
+        for name, bench in BENCHMARKS.items():
+            if only and only not in name:
+                continue
+            func = bench(scale, workdir)
+            best, median = measure(func, repeat)
+            results[name] = {"best": best, "median": median, "repeat": repeat}
+            print(f"  {name:28} {best * 1000:10.2f} мс (медиана {median * 1000:.2f} мс)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Сравнивает с базовым результатом, возвращает список регрессий"""
+    regressions = []
+    print("\nСравнение с базовым результатом:")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"  {name:28} нет в базовом результате")
+            continue
+        ratio = result["best"] / base["best"] if base["best"] else float("inf")
+        mark = ""
+        if ratio > 1 + tolerance:
+            mark = "  РЕГРЕССИЯ"
+            regressions.append(name)
+        print(f"  {name:28} x{ratio:6.2f}{mark}")
+    return regressions
+
+def main():
+    options, args = parse_options(sys.argv[1:])
+    print("=" * 60)
+    print(f"Замеры ZeroShell {VERSION} (Python {platform.python_version()})")
+    print("=" * 60)
+
+    results = run_benchmarks(options.get("only") or None, bool(options.get("quick")))
+    report = {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    out_path = options.get("out") or "benchmark_results.json"
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены: {out_path}")
+
+    if options.get("save-baseline"):
+        with open(options["save-baseline"], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Базовый результат сохранен: {options['save-baseline']}")
+
+    if options.get("baseline"):
+        with open(options["baseline"], 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        tolerance = float(options.get("tolerance") or DEFAULT_TOLERANCE)
+        regressions = compare(results, baseline, tolerance)
+        if regressions:
+            print(f"\nЗамедление больше {tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3811 @@
+# zeroshell_core.py - Интерпретатор ZeroBasics (запускается через ZeroShell.py)
+import os
+import sys
+import time
+import random
+import gc
+import io
+import re
+import pickle
+import marshal
+import types
+import operator
+import math
+from functools import lru_cache
+from collections import OrderedDict, deque
+
+VERSION = "0.10"
+# Версия формата скомпилированных инструкций (меняется вместе с компилятором)
+BYTECODE_VERSION = 11
+
+# ANSI-коды цветов Print (те же, что colorama.Fore и colorama.Style)
+COLOR_CODES = {
+    "black": "\x1b[30m",
+    "red": "\x1b[31m",
+    "green": "\x1b[32m",
+    "yellow": "\x1b[33m",
+    "blue": "\x1b[34m",
+    "magenta": "\x1b[35m",
+    "cyan": "\x1b[36m",
+    "white": "\x1b[37m",
+    "reset": "\x1b[0m",
+}
+DEFAULT_COLOR = COLOR_CODES["white"]
+RESET_CODE = COLOR_CODES["reset"]
+
+# Есть ли цвета: None - colorama еще не загружалась (это делает первый цветной вывод)
+COLOR_SUPPORT = None
+
+def color_support():
+    """Загружает и включает colorama при первом цветном выводе.
+    
+    Как и при включении во время запуска, оборачиваются настоящие потоки
+    вывода, а не временно перенаправленные (пакетный запуск).
+    """
+    global COLOR_SUPPORT
+    if COLOR_SUPPORT is None:
+        try:
+            import colorama
+        except ImportError:
+            COLOR_SUPPORT = False
+            return False
+        redirected = sys.stdout, sys.stderr
+        if sys.__stdout__ is not None:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        colorama.init()
+        if redirected[0] is not sys.__stdout__:
+            sys.stdout = redirected[0]
+        if redirected[1] is not sys.__stderr__:
+            sys.stderr = redirected[1]
+        COLOR_SUPPORT = True
+    return COLOR_SUPPORT
+
+# Коды операций скомпилированных инструкций
+OPCODES = (
+    "nop", "print", "input", "chp", "endchp", "assign", "if", "calc", "rpl",
+    "wait", "exit", "pressed", "random", "save", "mkdir", "con", "run",
+    "call", "return", "flush", "read", "echo", "set", "switch", "native",
+)
+
+# Ссылка на переменную: $ и буквы, цифры или _
+VAR_PATTERN = re.compile(r'\$(\w+)')
+
+def split_variables(text, literal, pieces):
+    """Делит текст на литералы и имена переменных, дописывая их в шаблон"""
+    pos = 0
+    for match in VAR_PATTERN.finditer(text):
+        literal.append(text[pos:match.start()])
+        pieces.append("".join(literal))
+        pieces.append(sys.intern(match.group(1)))
+        literal.clear()
+        pos = match.end()
+    literal.append(text[pos:])
+
+@lru_cache(maxsize=8192)
+def compile_template(text, braces=True):
+    """Компилирует строку с $переменными в шаблон.
+    
+    Шаблон - кортеж, в котором на четных местах стоят готовые куски текста,
+    а на нечетных - имена переменных. При braces=True строка разбирается как
+    в Print: внешние фигурные скобки снимаются, парные {...} раскрываются.
+    """
+    pieces = []
+    literal = []
+    if braces and text.startswith('{') and text.endswith('}'):
+        text = text[1:-1]
+    
+    if not braces:
+        split_variables(text, literal, pieces)
+    else:
+        i = 0
+        length = len(text)
+        while i < length:
+            start = text.find('{', i)
+            if start == -1:
+                split_variables(text[i:], literal, pieces)
+                break
+            split_variables(text[i:start], literal, pieces)
+            
+            # Ищем парную закрывающую скобку
+            brace_count = 1
+            j = start + 1
+            while j < length and brace_count > 0:
+                if text[j] == '{':
+                    brace_count += 1
+                elif text[j] == '}':
+                    brace_count -= 1
+                j += 1
+            
+            if brace_count == 0:
+                split_variables(text[start+1:j-1], literal, pieces)
+                i = j
+            else:
+                # Непарная открывающая скобка, оставляем как есть
+                literal.append('{')
+                i = start + 1
+    
+    pieces.append("".join(literal))
+    return tuple(pieces)
+
+# Лексемы выражений calc: числа, $переменные, операторы и скобки
+NUMBER = r'(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?'
+CALC_TOKEN = re.compile(r'\s*(?:(' + NUMBER + r')|\$(\w+)|(\*\*|//|[-+*/%()]))')
+NUMBER_VALUE = re.compile(r'\s*[+-]?' + NUMBER + r'\s*')
+
+def power(base, exponent):
+    """Степень без перехода в комплексные числа"""
+    result = base ** exponent
+    if isinstance(result, complex):
+        raise ValueError("комплексный результат")
+    return result
+
+BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    '%': operator.mod,
+    '**': power,
+}
+
+def to_number(value):
+    """Переводит значение переменной в int или float"""
+    if isinstance(value, (int, float)):
+        return value
+    if not NUMBER_VALUE.fullmatch(value):
+        raise ValueError(f"не число: {value!r}")
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+# Целые длиннее стольких бит проверяются при calc: str() для них может
+# не сработать из-за ограничения числа цифр (Python 3.11+)
+MAX_PLAIN_INT_BITS = 14000
+
+def calc_result(value):
+    """Результат calc; ValueError, если число нельзя перевести в текст"""
+    if type(value) is int and value.bit_length() > MAX_PLAIN_INT_BITS:
+        str(value)
+    return value
+
+def to_text(value):
+    """Строковое представление значения переменной для Print, save и if"""
+    if type(value) is str:
+        return value
+    return str(value)
+
+def join_words(words):
+    """Слова Print через пробел, как их склеивает print_lines: пустые слова в начале пропускаются"""
+    for i, word in enumerate(words):
+        if word:
+            return " ".join(words[i:])
+    return ""
+
+def to_count(value):
+    """Число повторов rpl из значения переменной.
+    
+    Дробные числа не принимаются, как и строки вида "1.5".
+    """
+    if type(value) is int:
+        return value
+    if isinstance(value, float):
+        raise ValueError(f"не целое число: {value!r}")
+    return int(value)
+
+def number_literal(text):
+    """Постоянное число выражения"""
+    value = float(text) if '.' in text or 'e' in text.lower() else int(text)
+    return lambda variables: value
+
+def variable_name(word):
+    """Имя переменной без $. Имена интернируются: все команды и словарь
+    переменных ссылаются на один и тот же объект строки"""
+    return sys.intern(word[1:] if word.startswith('$') else word)
+
+def variable_reference(name):
+    """Чтение переменной по имени во время вычисления"""
+    name = sys.intern(name)
+    return lambda variables: to_number(variables[name])
+
+def binary_operation(op, left, right):
+    func = BINARY_OPERATORS[op]
+    return lambda variables: func(left(variables), right(variables))
+
+class ExpressionParser:
+    """Разбор выражения calc методом рекурсивного спуска.
+    
+    Приоритеты как в Python: ** выше унарного минуса,
+    затем * / // %, затем + -.
+    """
+    def __init__(self, text):
+        self.tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = CALC_TOKEN.match(text, pos)
+            if not match:
+                raise ValueError(f"неизвестный символ в выражении: {text[pos:]!r}")
+            number, name, op = match.groups()
+            if number is not None:
+                self.tokens.append(("num", number))
+            elif name is not None:
+                self.tokens.append(("var", name))
+            else:
+                self.tokens.append(("op", op))
+            pos = match.end()
+        self.pos = 0
+    
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+    
+    def take_operator(self, *ops):
+        kind, value = self.peek()
+        if kind == "op" and value in ops:
+            self.pos += 1
+            return value
+        return None
+    
+    def parse(self):
+        node = self.parse_sum()
+        if self.pos != len(self.tokens):
+            raise ValueError("лишние символы в выражении")
+        return node
+    
+    def parse_sum(self):
+        node = self.parse_product()
+        while True:
+            op = self.take_operator('+', '-')
+            if op is None:
+                return node
+            node = self.binary(op, node, self.parse_product())
+    
+    def parse_product(self):
+        node = self.parse_unary()
+        while True:
+            op = self.take_operator('*', '/', '//', '%')
+            if op is None:
+                return node
+            node = self.binary(op, node, self.parse_unary())
+    
+    def parse_unary(self):
+        op = self.take_operator('+', '-')
+        if op is None:
+            return self.parse_power()
+        return self.unary(op, self.parse_unary())
+    
+    def parse_power(self):
+        node = self.parse_atom()
+        if self.take_operator('**'):
+            node = self.binary('**', node, self.parse_unary())
+        return node
+    
+    def parse_atom(self):
+        kind, value = self.peek()
+        self.pos += 1
+        if kind == "num":
+            return self.number(value)
+        if kind == "var":
+            return self.variable(value)
+        if kind == "op" and value == '(':
+            node = self.parse_sum()
+            if not self.take_operator(')'):
+                raise ValueError("нет закрывающей скобки")
+            return node
+        raise ValueError("ожидалось число, переменная или скобка")
+    
+    # Узлы выражения: функции от словаря переменных
+    def number(self, text):
+        return number_literal(text)
+    
+    def variable(self, name):
+        return variable_reference(name)
+    
+    def binary(self, op, left, right):
+        return binary_operation(op, left, right)
+    
+    def unary(self, op, operand):
+        if op == '-':
+            return lambda variables: -operand(variables)
+        return lambda variables: +operand(variables)
+
+class ExpressionSource(ExpressionParser):
+    """Разбор выражения calc в исходный текст Python для CodeGenerator.
+    
+    Операции те же, что у ExpressionParser, поэтому результат и ошибки
+    (KeyError, ValueError, ArithmeticError) совпадают.
+    """
+    def number(self, text):
+        value = number_literal(text)(None)
+        if isinstance(value, float) and not math.isfinite(value):
+            return f"float({text!r})"
+        return repr(value)
+    
+    def variable(self, name):
+        return f"to_number(variables[{name!r}])"
+    
+    def binary(self, op, left, right):
+        if op == '**':
+            return f"power({left}, {right})"
+        return f"({left} {op} {right})"
+    
+    def unary(self, op, operand):
+        return f"({op}{operand})"
+
+class Expression:
+    """Скомпилированное выражение calc.
+    
+    evaluate(variables) вычисляет значение. В кэш на диске выражение
+    сохраняется исходным текстом и собирается заново при загрузке.
+    """
+    __slots__ = ("text", "evaluate")
+    
+    def __init__(self, text, evaluate):
+        self.text = text
+        self.evaluate = evaluate
+    
+    def __reduce__(self):
+        return (compile_expression, (self.text,))
+
+@lru_cache(maxsize=4096)
+def compile_expression(text):
+    """Компилирует выражение calc (ValueError при ошибке в выражении)"""
+    return Expression(text, ExpressionParser(text).parse())
+
+# Максимальная глубина вложенных вызовов Call
+MAX_CALL_DEPTH = 256
+# Самая длинная строка read; более длинные читаются кусками такого размера
+MAX_READ_LINE = 1 << 20
+# Сколько строк вложенного rpl разворачивается заранее; больше - повторяется при выполнении
+MAX_FOLDED_LINES = 4096
+
+class Instruction:
+    """Скомпилированная команда ZeroBasics"""
+    __slots__ = ("op", "source", "args", "line")
+    
+    def __init__(self, op, source, args=None, line=0):
+        self.op = op          # код операции из OPCODES
+        self.source = source  # исходная строка без комментария
+        self.args = args      # заранее разобранные операнды
+        self.line = line      # номер строки в файле скрипта (0 - ввод в оболочке)
+    
+    def children(self):
+        """Вложенные команды (тело rpl, команда после if, If pressed и read, варианты switch)"""
+        if self.op in ("if", "pressed", "read"):
+            command = self.args[-1]
+        elif self.op == "rpl":
+            command = self.args[2]
+        elif self.op in ("switch", "native"):
+            return list(self.args[-1])
+        else:
+            return []
+        return [command] if command is not None else []
+    
+    def __reduce__(self):
+        return (Instruction, (self.op, self.source, self.args, self.line))
+    
+    def set_line(self, line):
+        """Проставляет номер строки команде и всем вложенным"""
+        self.line = line
+        for child in self.children():
+            child.set_line(line)
+    
+    def __repr__(self):
+        return f"Instruction({self.op!r}, {self.source!r})"
+
+def object_size(obj, seen):
+    """Размер объекта вместе с вложенными (объекты из seen не считаются)"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, Instruction):
+        size += sum(object_size(getattr(obj, slot), seen) for slot in Instruction.__slots__)
+    elif isinstance(obj, Expression):
+        size += object_size(obj.text, seen)
+    elif isinstance(obj, (tuple, list)):
+        size += sum(object_size(item, seen) for item in obj)
+    elif isinstance(obj, dict):
+        size += sum(object_size(key, seen) + object_size(value, seen) for key, value in obj.items())
+    return size
+
+@lru_cache(maxsize=1024)
+def compile_native(source):
+    """Функция блока из сгенерированного текста (одинаковый текст компилируется один раз)"""
+    namespace = {}
+    exec(compile(source, "<zeroshell native>", "exec"), globals(), namespace)
+    return namespace["block"]
+
+class NativeBlock:
+    """Команды главы, переведенные в функцию Python.
+    
+    function(shell, consts) выполняет их и возвращает True. В кэш на диске
+    блок сохраняется вместе с байт-кодом функции (marshal): при загрузке
+    той же версией Python compile() не нужен, иначе текст компилируется заново.
+    """
+    __slots__ = ("source", "consts", "function")
+    
+    def __init__(self, source, consts, tag=None, code=None):
+        self.source = source
+        self.consts = consts      # объекты, на которые ссылается текст: K[0], K[1]...
+        self.function = None
+        if code is not None and tag == sys.implementation.cache_tag:
+            try:
+                self.function = types.FunctionType(marshal.loads(code), globals(), "block")
+            except (EOFError, ValueError, TypeError):
+                pass
+        if self.function is None:
+            self.function = compile_native(source)
+    
+    def __reduce__(self):
+        code = marshal.dumps(self.function.__code__)
+        return (NativeBlock, (self.source, self.consts, sys.implementation.cache_tag, code))
+
+class CodeGenerator:
+    """Переводит главы в исходный текст Python (режим --native).
+    
+    Подряд идущие команды, которые не передают управление циклу выполнения
+    (Print, присваивания, calc, if и rpl с такими же командами), становятся
+    одной функцией: rpl - циклом for, if - обычным if, шаблоны - склейкой
+    строк. Run, Call, Input, Wait и остальные команды с переходами и
+    ожиданием выполняются как раньше, между блоками.
+    """
+    # Команды без переходов; у if, rpl и switch проверяются вложенные
+    STRAIGHT = {"nop", "echo", "print", "assign", "set", "calc", "random", "save", "flush", "mkdir", "con"}
+    
+    def __init__(self):
+        self.lines = []
+        self.consts = []
+    
+    @classmethod
+    def straight(cls, instruction):
+        """Не передает ли команда управление циклу выполнения"""
+        if instruction is None or instruction.op in cls.STRAIGHT:
+            return True
+        if instruction.op in ("if", "rpl"):
+            return cls.straight(instruction.args[2])
+        if instruction.op == "switch":
+            return all(cls.straight(case) for case in instruction.args[2])
+        return False
+    
+    def compile_code(self, code):
+        """Команды главы, в которых прямые участки заменены командами native"""
+        compiled = []
+        run = []
+        for instruction in code:
+            if self.straight(instruction):
+                run.append(instruction)
+                continue
+            if run:
+                compiled.append(self.block(run))
+                run = []
+            compiled.append(instruction)
+        if run:
+            compiled.append(self.block(run))
+        return compiled
+    
+    def block(self, instructions):
+        """Команда native для участка главы"""
+        self.lines = [
+            "def block(shell, K):",
+            "    variables = shell.variables",
+            "    get = variables.get",
+            "    text = to_text",
+            "    handlers = shell.handlers",
+            "    write_line = shell.output.write_line",
+        ]
+        self.consts = []
+        for instruction in instructions:
+            self.emit(f"# {instruction.line}: {instruction.source!r}", 1)
+            self.statement(instruction, 1)
+        self.emit("return True", 1)
+        block = NativeBlock("\n".join(self.lines) + "\n", tuple(self.consts))
+        first = instructions[0]
+        source = first.source if len(instructions) == 1 else f"{first.source} (+{len(instructions) - 1})"
+        return Instruction("native", source, (block, tuple(instructions)), first.line)
+    
+    def emit(self, line, depth):
+        self.lines.append("    " * depth + line)
+    
+    def const(self, value):
+        """Ссылка на объект, который нельзя записать литералом"""
+        self.consts.append(value)
+        return f"K[{len(self.consts) - 1}]"
+    
+    def literal(self, value):
+        if type(value) in (str, int):
+            return repr(value)
+        return self.const(value)
+    
+    def template(self, template):
+        """Выражение, равное render(template)"""
+        if len(template) == 1:
+            return repr(template[0])
+        parts = []
+        for i, piece in enumerate(template):
+            if i % 2:
+                parts.append(f"text(get({piece!r}, ''))")
+            elif piece:
+                parts.append(repr(piece))
+        return " + ".join(parts)
+    
+    def statement(self, instruction, depth):
+        """Текст одной команды; пустое тело заменяется на pass"""
+        size = len(self.lines)
+        if instruction is not None:
+            getattr(self, "gen_" + instruction.op)(instruction, depth)
+        if len(self.lines) == size:
+            self.emit("pass", depth)
+    
+    def gen_nop(self, instruction, depth):
+        pass
+    
+    def gen_handler(self, instruction, depth):
+        self.emit(f"handlers[{instruction.op!r}]({self.const(instruction)})", depth)
+    
+    gen_random = gen_save = gen_flush = gen_mkdir = gen_con = gen_handler
+    
+    def gen_echo(self, instruction, depth):
+        for text, color in instruction.args:
+            self.emit(f"write_line({text!r}, {color!r})", depth)
+    
+    def gen_print(self, instruction, depth):
+        # Те же строки, что собирает print_lines, но без разбора сегментов
+        words = []
+        color = None
+        
+        def flush_line():
+            if not words:
+                return
+            line = words[0] if len(words) == 1 else f"join_words(({', '.join(words)},))"
+            self.emit(f"line = {line}", depth)
+            self.emit("if line:", depth)
+            self.emit(f"write_line(line.strip(), {color!r})", depth + 1)
+            words.clear()
+        
+        for kind, value in instruction.args:
+            if kind == "nline":
+                flush_line()
+                self.emit("write_line('')", depth)
+                color = None
+            elif kind == "col":
+                flush_line()
+                color = value
+            else:
+                words.append(self.template(value))
+        flush_line()
+    
+    def gen_assign(self, instruction, depth):
+        var_name, value = instruction.args
+        self.emit(f"variables[{var_name!r}] = {self.template(value)}", depth)
+    
+    def gen_set(self, instruction, depth):
+        var_name, value = instruction.args
+        self.emit(f"variables[{var_name!r}] = {self.literal(value)}", depth)
+    
+    def gen_calc(self, instruction, depth):
+        expr, result_var = instruction.args
+        if expr is None:
+            self.emit(f"variables[{result_var!r}] = 0", depth)
+            return
+        self.emit("try:", depth)
+        self.emit(f"variables[{result_var!r}] = calc_result({ExpressionSource(expr.text).parse()})", depth + 1)
+        self.emit("except (ArithmeticError, ValueError, KeyError):", depth)
+        self.emit(f"variables[{result_var!r}] = 0", depth + 1)
+    
+    def gen_if(self, instruction, depth):
+        var_name, value, command = instruction.args
+        self.emit(f"if text(get({var_name!r}, '')) == {self.template(value)}:", depth)
+        self.statement(command, depth + 1)
+    
+    def gen_switch(self, instruction, depth):
+        # Варианты проверяются по очереди, как исходные if
+        for case in instruction.args[2]:
+            self.gen_if(case, depth)
+    
+    def gen_rpl(self, instruction, depth):
+        count, count_var, command, lines = instruction.args
+        # В режиме отладки rpl печатает скорость, это делает op_rpl
+        self.emit("if shell.debug:", depth)
+        self.emit(f"handlers['rpl']({self.const(instruction)})", depth + 1)
+        self.emit("else:", depth)
+        # Ошибка в теле, как и в op_rpl, молча прерывает повторы
+        self.emit("try:", depth + 1)
+        if count_var is not None:
+            self.emit(f"count = to_count(get({count_var!r}, 0))", depth + 2)
+            count = "count"
+        if lines is not None:
+            self.emit(f"shell.output.write_repeated({self.const(lines)}, {count})", depth + 2)
+        elif command is not None:
+            self.emit(f"for i in range(1, {count} + 1):", depth + 2)
+            self.statement(command, depth + 3)
+            # Как в op_rpl: вывод до долгого цикла сбрасывается по max_delay
+            self.emit("if not i & 1023:", depth + 3)
+            self.emit("shell.output.poll()", depth + 4)
+        else:
+            self.emit("pass", depth + 2)
+        self.emit("except:", depth + 1)
+        self.emit("pass", depth + 2)
+
+class SymbolTable:
+    """Таблица глав скрипта: порядок, строки и поиск по имени"""
+    def __init__(self):
+        self.entry = None       # глава, с которой начинается выполнение
+        self.order = []         # имена глав в порядке объявления
+        self.names = {}         # имя в нижнем регистре -> имя главы
+        self.lines = {}         # имя главы -> [первая строка, последняя строка]
+        self.diagnostics = []   # предупреждения, найденные при загрузке
+        self.removed = {}       # главы, удаленные оптимизатором: имя -> строки
+    
+    def add(self, name, line=0):
+        """Регистрирует главу (повторное объявление заменяет ее команды)"""
+        if name in self.lines:
+            self.diagnostics.append(f"строка {line}: глава {name} объявлена повторно")
+            self.lines[name] = [line, line]
+            return
+        if self.entry is None:
+            self.entry = name
+        self.order.append(name)
+        self.names.setdefault(name.lower(), name)
+        self.lines[name] = [line, line]
+    
+    def extend(self, name, line):
+        """Расширяет диапазон строк главы до line"""
+        lines = self.lines[name]
+        lines[1] = max(lines[1], line)
+    
+    def remove(self, name):
+        """Убирает главу из таблицы (недостижимую, после оптимизации)"""
+        self.order.remove(name)
+        self.removed[name] = self.lines.pop(name)
+        key = name.lower()
+        if self.names.get(key) == name:
+            del self.names[key]
+            for other in self.order:
+                if other.lower() == key:
+                    self.names[key] = other
+                    break
+    
+    def resolve(self, name):
+        """Имя главы с учетом регистра или None"""
+        if name in self.lines:
+            return name
+        return self.names.get(name.lower())
+
+class LazyChapters:
+    """Главы большого скрипта, которые компилируются при первом входе.
+    
+    Файл отображается в память (mmap). При загрузке выполняется один
+    проход, который находит строки Chp/End Chp и запоминает, какие куски
+    файла относятся к каждой главе. Скомпилированные главы хранятся
+    в кэше на max_cached глав, давно не используемые вытесняются.
+    """
+    HEADER = re.compile(rb'^[ \t\f\v]*(?:chp +(\S[^\r\n]*?)|(end chp))[ \t\f\v\r]*$', re.I | re.M)
+    COUNT_CHUNK = 1 << 20
+    
+    def __init__(self, filepath, compile_line, max_cached=256):
+        self.compile_line = compile_line
+        self.max_cached = max_cached
+        self.segments = {}          # глава -> [(начало, конец, номер первой строки)]
+        self.cache = OrderedDict()  # скомпилированные главы, последние - свежие
+        self.fixed = {}             # главы, созданные командой Chp в оболочке
+        self.symbols = SymbolTable()
+        import mmap
+        
+        self.file = open(filepath, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.index()
+        except Exception:
+            self.close()
+            raise
+    
+    def count_lines(self, start, end):
+        """Число переводов строки между start и end (кусками, без копии файла)"""
+        if end - start <= self.COUNT_CHUNK:
+            return self.data[start:end].count(b'\n')
+        count = 0
+        while start < end:
+            stop = min(end, start + self.COUNT_CHUNK)
+            count += self.data[start:stop].count(b'\n')
+            start = stop
+        return count
+    
+    def has_commands(self, start, end):
+        for line in self.data[start:end].decode('utf-8').splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                return True
+        return False
+    
+    def index(self):
+        """Находит заголовки глав и делит файл на куски"""
+        symbols = self.symbols
+        current = None   # глава, открытая Chp
+        last = None      # последняя новая глава, для команд вне глав
+        pos = 0
+        line = 1
+        
+        def add_region(start, end, first_line):
+            nonlocal current, last
+            if start >= end:
+                return
+            owner = current if current is not None else last
+            if owner is None:
+                # Команды до первой главы образуют главу main
+                if not self.has_commands(start, end):
+                    return
+                owner = current = last = "main"
+                self.segments[owner] = []
+                symbols.add(owner, first_line)
+            self.segments[owner].append((start, end, first_line))
+            last_line = first_line + self.count_lines(start, end)
+            if self.data[end - 1] == ord('\n'):
+                last_line -= 1
+            symbols.extend(owner, last_line)
+        
+        for match in self.HEADER.finditer(self.data):
+            header_line = line + self.count_lines(pos, match.start())
+            add_region(pos, match.start(), line)
+            name, end_marker = match.group(1), match.group(2)
+            if end_marker:
+                if current is not None:
+                    symbols.extend(current, header_line)
+                current = None
+            else:
+                name = name.decode('utf-8').strip()
+                if name not in self.segments:
+                    last = name
+                self.segments[name] = []
+                self.cache.pop(name, None)
+                symbols.add(name, header_line)
+                current = name
+            # Следующий кусок начинается со строки после заголовка
+            pos = match.end() + 1
+            line = header_line + 1
+        add_region(pos, len(self.data), line)
+    
+    def parse(self, name):
+        """Компилирует команды главы из ее кусков файла"""
+        code = []
+        for start, end, first_line in self.segments[name]:
+            text = self.data[start:end].decode('utf-8')
+            for line_num, line in enumerate(io.StringIO(text, newline=None), first_line):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                instruction = self.compile_line(line)
+                if instruction is not None:
+                    instruction.set_line(line_num)
+                    code.append(instruction)
+        return code
+    
+    def __getitem__(self, name):
+        if name in self.fixed:
+            return self.fixed[name]
+        code = self.cache.get(name)
+        if code is not None:
+            self.cache.move_to_end(name)
+            return code
+        if name not in self.segments:
+            raise KeyError(name)
+        code = self.cache[name] = self.parse(name)
+        while len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
+        return code
+    
+    def __setitem__(self, name, code):
+        self.fixed[name] = code
+    
+    def __contains__(self, name):
+        return name in self.fixed or name in self.segments
+    
+    def __len__(self):
+        return len(self.segments) + sum(1 for name in self.fixed if name not in self.segments)
+    
+    def __iter__(self):
+        yield from self.segments
+        for name in self.fixed:
+            if name not in self.segments:
+                yield name
+    
+    def keys(self):
+        return list(self)
+    
+    def values(self):
+        return [self[name] for name in self]
+    
+    def items(self):
+        return [(name, self[name]) for name in self]
+    
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+    
+    def close(self):
+        """Закрывает отображение файла"""
+        data = getattr(self, "data", None)
+        if data is not None:
+            data.close()
+        self.file.close()
+
+class Profiler:
+    """Профилировщик скрипта: время по строкам, главам и командам.
+    
+    Подменяет обработчики команд обертками, которые замеряют полное время
+    команды и собственное (без вложенных команд). Время Input и Wait
+    учитывается отдельно как ожидание, остальное - вычисления.
+    """
+    BLOCKING = ("input", "wait")
+    SORT_KEYS = ("self", "total", "count", "wait", "compute")
+    
+    def __init__(self, shell):
+        self.shell = shell
+        self.lines = {}     # instruction -> [глава, вызовы, всего, собственное, ожидание]
+        self.chapters = {}  # глава -> [команд, всего, ожидание]
+        self.commands = {}  # команда -> [вызовы, собственное, ожидание]
+        self.stacks = {}    # стек вызовов -> собственное время
+        self.frames = []    # активные команды: [стек, время вложенных, ожидание вложенных]
+    
+    def install(self):
+        """Включает замеры для всех обработчиков команд оболочки"""
+        shell = self.shell
+        shell.handlers = {op: self.wrap(op, handler) for op, handler in shell.handlers.items()}
+    
+    def wrap(self, op, handler):
+        perf_counter = time.perf_counter
+        frames = self.frames
+        blocking = op in self.BLOCKING
+        
+        def profiled(instruction):
+            chapter = self.shell.current_chapter
+            if frames:
+                stack = frames[-1][0] + (instruction,)
+            else:
+                callers = tuple(frame[0] for frame in self.shell.chapter_stack)
+                stack = callers + (chapter, instruction)
+            frame = [stack, 0.0, 0.0]
+            frames.append(frame)
+            start = perf_counter()
+            try:
+                return handler(instruction)
+            finally:
+                elapsed = perf_counter() - start
+                frames.pop()
+                own = elapsed - frame[1]
+                waited = frame[2] + (own if blocking else 0.0)
+                
+                line = self.lines.get(instruction)
+                if line is None:
+                    line = self.lines[instruction] = [chapter, 0, 0.0, 0.0, 0.0]
+                line[1] += 1
+                line[2] += elapsed
+                line[3] += own
+                line[4] += waited
+                
+                command = self.commands.setdefault(op, [0, 0.0, 0.0])
+                command[0] += 1
+                command[1] += own
+                command[2] += own if blocking else 0.0
+                
+                self.stacks[stack] = self.stacks.get(stack, 0.0) + own
+                if frames:
+                    frames[-1][1] += elapsed
+                    frames[-1][2] += waited
+                else:
+                    totals = self.chapters.setdefault(chapter, [0, 0.0, 0.0])
+                    totals[0] += 1
+                    totals[1] += elapsed
+                    totals[2] += waited
+        return profiled
+    
+    def report(self, sort="self", limit=20):
+        """Отчет в виде списка строк, отсортированный по sort"""
+        index = {"count": 1, "total": 2, "self": 3, "wait": 4}
+        if sort == "compute":
+            key = lambda item: item[1][2] - item[1][4]
+        else:
+            key = lambda item: item[1][index.get(sort, 3)]
+        
+        report = []
+        report.append("=" * 78)
+        report.append(f"ПРОФИЛЬ (сортировка: {sort})")
+        report.append("=" * 78)
+        report.append(f"{'вызовы':>9} {'всего, с':>10} {'свое, с':>10} {'ожидание':>10} {'вычисл.':>10}  строка")
+        for instruction, (chapter, count, total, own, waited) in sorted(self.lines.items(), key=key, reverse=True)[:limit]:
+            where = f"{chapter}:{instruction.line}" if chapter else "ввод"
+            report.append(f"{count:9} {total:10.4f} {own:10.4f} {waited:10.4f} {total - waited:10.4f}  {where} {instruction.source}")
+        
+        report.append("-" * 78)
+        report.append(f"{'команд':>9} {'всего, с':>10} {'ожидание':>10} {'вычисл.':>10}  глава")
+        for chapter, (count, total, waited) in sorted(self.chapters.items(), key=lambda item: item[1][1], reverse=True):
+            report.append(f"{count:9} {total:10.4f} {waited:10.4f} {total - waited:10.4f}  {chapter or 'ввод'}")
+        
+        report.append("-" * 78)
+        report.append(f"{'вызовы':>9} {'свое, с':>10} {'ожидание':>10} {'вычисл.':>10}  команда")
+        for op, (count, own, waited) in sorted(self.commands.items(), key=lambda item: item[1][1], reverse=True):
+            report.append(f"{count:9} {own:10.4f} {waited:10.4f} {own - waited:10.4f}  {op}")
+        report.append("=" * 78)
+        return report
+    
+    def frame_label(self, frame):
+        if isinstance(frame, Instruction):
+            label = f"{frame.line}: {frame.source}"
+        else:
+            label = f"Chp {frame}" if frame else "ввод"
+        # ';' разделяет кадры, поэтому в подписях его быть не должно
+        return label.replace(';', ',')
+    
+    def write_collapsed(self, path):
+        """Сохраняет стеки в формате collapsed stacks (flamegraph.pl, speedscope).
+        
+        Значение каждой строки - собственное время в микросекундах.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, seconds in self.stacks.items():
+                micros = int(seconds * 1000000)
+                if micros:
+                    f.write(";".join(self.frame_label(frame) for frame in stack) + f" {micros}\n")
+
+class OutputBuffer:
+    """Буферизованный консольный вывод.
+    
+    Строки копятся в памяти и записываются одним вызовом write, когда
+    буфер больше max_size символов, старше max_delay секунд или при явном
+    flush() (перед Input, Wait, Exit и в конце скрипта). Возраст буфера
+    проверяется при записи и в poll(), который цикл выполнения вызывает
+    на переходах между главами и в длинных rpl и read. Код цвета
+    выводится только при смене цвета, сброс - перед нецветным текстом
+    и при flush().
+    """
+    def __init__(self, max_size=8192, max_delay=0.1, stream=None):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.stream = stream  # None - текущий sys.stdout
+        self.chunks = []
+        self.size = 0
+        self.first_write = 0.0
+        self.color = None  # ANSI-код, действующий в конце буфера
+        self.colors = True # False - Print Col без ANSI-кодов (вывод не в терминал)
+    
+    def encode_line(self, chunks, text, color):
+        """Добавляет в chunks строку с нужными кодами цвета"""
+        code = None
+        if color and self.colors and (COLOR_SUPPORT or COLOR_SUPPORT is None and color_support()):
+            code = COLOR_CODES.get(color.lower(), DEFAULT_COLOR)
+        if code != self.color:
+            chunks.append(RESET_CODE if code is None else code)
+            self.color = code
+        chunks.append(text)
+        chunks.append("\n")
+    
+    def written(self, size):
+        """Учитывает size новых символов и сбрасывает буфер по порогу"""
+        if not self.size:
+            self.first_write = time.monotonic()
+        self.size += size
+        if self.size >= self.max_size or time.monotonic() - self.first_write >= self.max_delay:
+            self.flush()
+    
+    def poll(self):
+        """Сбрасывает буфер, если он старше max_delay (вывод без новых записей)"""
+        if self.size and time.monotonic() - self.first_write >= self.max_delay:
+            self.flush()
+    
+    def write_line(self, text, color=None):
+        """Добавляет строку в буфер (color - название цвета или None)"""
+        self.encode_line(self.chunks, text, color)
+        self.written(len(text) + 1)
+    
+    def write_repeated(self, lines, count):
+        """Выводит одни и те же строки count раз крупными кусками.
+        
+        Первое повторение может начинаться со смены цвета, все следующие
+        кодируются одинаково, поэтому готовый текст просто умножается.
+        """
+        if count <= 0 or not lines:
+            return
+        first = []
+        for text, color in lines:
+            self.encode_line(first, text, color)
+        block = "".join(first)
+        self.chunks.append(block)
+        self.written(len(block))
+        
+        count -= 1
+        if not count:
+            return
+        rest = []
+        for text, color in lines:
+            self.encode_line(rest, text, color)
+        block = "".join(rest)
+        per_chunk = max(1, self.max_size // max(1, len(block)))
+        while count > 0:
+            repeat = min(count, per_chunk)
+            self.chunks.append(block * repeat)
+            self.written(len(block) * repeat)
+            count -= repeat
+    
+    def flush(self):
+        """Записывает накопленный вывод в поток"""
+        if not self.chunks:
+            return
+        if self.color is not None:
+            self.chunks.append(RESET_CODE)
+            self.color = None
+        stream = self.stream or sys.stdout
+        stream.write("".join(self.chunks))
+        stream.flush()
+        self.chunks.clear()
+        self.size = 0
+
+class CallbackStream:
+    """Поток вывода, который передает текст функции (для встраивания)"""
+    def __init__(self, callback):
+        self.callback = callback
+    
+    def write(self, text):
+        self.callback(text)
+    
+    def flush(self):
+        pass
+
+def make_temp(path):
+    """Создает пустой временный файл рядом с path и возвращает его имя"""
+    import tempfile
+    folder, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=folder or None)
+    os.close(fd)
+    return temp_path
+
+class FileWriter:
+    """Запись файлов для save/append в фоновом потоке.
+    
+    Команды только ставят запись в очередь. Поток забирает очередь
+    целиком: дописывания в один файл склеиваются, а перезапись отменяет
+    все более ранние записи в тот же файл. Файлы для дописывания остаются
+    открытыми (не больше max_handles, давно не используемые закрываются),
+    перезапись идет через временный файл и os.replace, поэтому файл
+    никогда не бывает записан наполовину. flush() ждет, пока все записи
+    дойдут до файлов, и возвращает ошибки, случившиеся в потоке.
+    """
+    def __init__(self, max_handles=32, max_pending=8 << 20):
+        self.max_handles = max_handles
+        self.max_pending = max_pending  # байт в очереди, после которых save ждет поток
+        self.condition = None   # создается с потоком при первой записи
+        self.pending = []       # [вид, путь, [куски текста]] в порядке команд
+        self.latest = {}        # путь -> последняя запись очереди для этого файла
+        self.pending_size = 0
+        self.busy = False
+        self.closing = False
+        self.thread = None
+        self.handles = OrderedDict()  # путь -> открытый файл для дописывания
+        self.made_dirs = set()
+        self.errors = []
+    
+    def submit(self, kind, path, text):
+        """Ставит запись в очередь (kind - replace или append)"""
+        if self.thread is None:
+            self.start()
+        with self.condition:
+            while self.pending_size > self.max_pending:
+                self.condition.wait()
+            entry = self.latest.get(path)
+            if kind == "append" and entry is not None:
+                entry[2].append(text)
+            else:
+                if kind == "replace" and entry is not None:
+                    for item in self.pending:
+                        if item[1] == path:
+                            self.pending_size -= sum(len(chunk) for chunk in item[2])
+                    self.pending = [item for item in self.pending if item[1] != path]
+                entry = [kind, path, [text]]
+                self.pending.append(entry)
+                self.latest[path] = entry
+            self.pending_size += len(text)
+            self.condition.notify_all()
+    
+    def start(self):
+        """Запускает поток записи (threading загружается только скриптам с save)"""
+        import threading
+        
+        if self.condition is None:
+            self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.work, name="zeroshell-files", daemon=True)
+        self.thread.start()
+    
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                batch = self.pending
+                self.pending = []
+                self.latest = {}
+                self.pending_size = 0
+                self.busy = True
+                self.condition.notify_all()
+            for kind, path, chunks in batch:
+                try:
+                    if kind == "append":
+                        self.handle(path).write("".join(chunks))
+                    else:
+                        self.replace(path, "".join(chunks))
+                except (OSError, ValueError) as e:
+                    self.errors.append(f"{path}: {e}")
+            for path, f in list(self.handles.items()):
+                try:
+                    f.flush()
+                except (OSError, ValueError) as e:
+                    self.errors.append(f"{path}: {e}")
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+    
+    def make_dirs(self, path):
+        folder = os.path.dirname(path)
+        if folder and folder not in self.made_dirs:
+            os.makedirs(folder, exist_ok=True)
+            self.made_dirs.add(folder)
+    
+    def handle(self, path):
+        """Открытый файл для дописывания (из пула или новый)"""
+        f = self.handles.get(path)
+        if f is not None:
+            self.handles.move_to_end(path)
+            return f
+        self.make_dirs(path)
+        f = open(path, 'a', encoding='utf-8')
+        self.handles[path] = f
+        while len(self.handles) > self.max_handles:
+            self.handles.popitem(last=False)[1].close()
+        return f
+    
+    def replace(self, path, text):
+        f = self.handles.pop(path, None)
+        if f is not None:
+            f.close()
+        self.make_dirs(path)
+        # Уникальное имя на каждую запись: оболочки одного процесса
+        # (пул, сессии сервера) могут сохранять один и тот же файл
+        temp_path = make_temp(path)
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def flush(self):
+        """Ждет окончания всех записей, возвращает и очищает список ошибок"""
+        if self.thread is None:
+            return []
+        with self.condition:
+            while self.pending or self.busy:
+                self.condition.wait()
+        errors, self.errors = self.errors, []
+        return errors
+    
+    def close(self):
+        errors = self.flush()
+        if self.thread is not None:
+            with self.condition:
+                self.closing = True
+                self.condition.notify_all()
+            self.thread.join()
+            self.thread = None
+            self.closing = False
+        for f in self.handles.values():
+            f.close()
+        self.handles.clear()
+        self.made_dirs.clear()
+        return errors
+
+class Replay:
+    """Записанная очередь событий для Input и If pressed.
+    
+    Событие - пара (вид, значение): ("input", "текст"), ("pressed", "ctrl+s")
+    или ("seed", "123") для генератора random. Простая строка считается
+    ответом для Input. Источник - список, генератор или файл (from_file).
+    """
+    def __init__(self, events):
+        self.events = iter(events)
+        self.pending = None
+    
+    @classmethod
+    def from_file(cls, path):
+        """Читает события из файла: по одному "вид значение" на строку"""
+        def events():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.rstrip('\n')
+                    if not line or line.startswith('#'):
+                        continue
+                    kind, _, value = line.partition(' ')
+                    yield kind, value
+        return cls(events())
+    
+    def peek(self):
+        """Следующее событие без извлечения (None - очередь пуста)"""
+        if self.pending is None:
+            event = next(self.events, None)
+            if isinstance(event, str):
+                event = ("input", event)
+            self.pending = event
+        return self.pending
+    
+    def take(self):
+        event = self.peek()
+        self.pending = None
+        return event
+    
+    def next_input(self):
+        """Ответ для Input (EOFError, если ответы закончились)"""
+        event = self.take()
+        if event is None:
+            raise EOFError("закончились ответы для Input")
+        kind, value = event
+        if kind != "input":
+            raise ValueError(f"ожидался ответ для Input, а в записи {kind} {value}")
+        return value
+    
+    def next_key(self, key):
+        """Была ли нажата клавиша key в этом месте записи"""
+        event = self.peek()
+        if event is not None and event[0] == "pressed" and normalize_key(event[1]) == normalize_key(key):
+            self.take()
+            return True
+        return False
+
+class Recorder:
+    """Записывает события Input и If pressed для последующего Replay.
+    
+    target - путь к файлу или список, в который добавляются пары.
+    """
+    def __init__(self, target):
+        self.target = target
+        self.file = None
+        if isinstance(target, str):
+            self.file = open(target, 'w', encoding='utf-8')
+    
+    def record(self, kind, value):
+        if self.file is None:
+            self.target.append((kind, str(value)))
+        else:
+            self.file.write(f"{kind} {value}\n")
+            self.file.flush()
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+KEY_ALIASES = {"return": "enter", "esc": "escape", "del": "delete", "пробел": "space"}
+
+def normalize_key(key):
+    """Имя клавиши из If pressed в виде, который выдает KeyboardLoop"""
+    key = key.strip().lower().replace(" ", "").replace("control+", "ctrl+")
+    return KEY_ALIASES.get(key, key)
+
+class KeyboardLoop:
+    """Неблокирующий ввод с клавиатуры и таймеры на одном цикле asyncio.
+    
+    Терминал переводится в режим cbreak через termios (Linux и другие
+    POSIX-системы), stdin читается через add_reader без отдельного
+    потока. Wait и Input ждут на цикле, не занимая процессор, и по пути
+    выполняют команды, привязанные к клавишам через If pressed.
+    Остальные нажатия копятся в буфере: печатные уходят в Input,
+    особые (ctrl+s и т.п.) проверяет следующая команда If pressed.
+    """
+    ESCAPES = {
+        "[A": "up", "[B": "down", "[C": "right", "[D": "left",
+        "[H": "home", "[F": "end", "[2~": "insert", "[3~": "delete",
+        "[5~": "pageup", "[6~": "pagedown",
+        "OP": "f1", "OQ": "f2", "OR": "f3", "OS": "f4",
+    }
+    SPECIAL = {"\r": "enter", "\n": "enter", "\t": "tab", "\x7f": "backspace",
+               "\x08": "backspace", " ": "space"}
+    MAX_KEYS = 256
+    
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.keys = deque(maxlen=self.MAX_KEYS)  # нажатия, еще не разобранные
+        self.held = deque(maxlen=16)             # особые клавиши, нажатые во время Input
+        self.bindings = {}                       # клавиша -> команда If pressed
+        self.loop = None
+        self.fd = None
+        self.saved = None
+    
+    @staticmethod
+    def available():
+        """Можно ли читать клавиши напрямую (termios и настоящий терминал)"""
+        try:
+            import termios
+        except ImportError:
+            return False
+        try:
+            return sys.stdin.isatty()
+        except (AttributeError, ValueError):
+            return False
+    
+    def start(self):
+        # asyncio и termios нужны только интерактивным запускам
+        import asyncio
+        import codecs
+        self.asyncio = asyncio
+        self.fd = sys.stdin.fileno()
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.loop = asyncio.new_event_loop()
+        self.event = asyncio.Event()
+        self.resume()
+        self.loop.add_reader(self.fd, self.on_readable)
+    
+    def resume(self):
+        """Режим cbreak: клавиши без Enter и без эха, ctrl+s/ctrl+q не перехватываются"""
+        import termios
+        self.saved = termios.tcgetattr(self.fd)
+        mode = termios.tcgetattr(self.fd)
+        mode[0] &= ~termios.IXON
+        mode[3] &= ~(termios.ICANON | termios.ECHO | termios.IEXTEN)
+        mode[6][termios.VMIN] = 1
+        mode[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, mode)
+    
+    def pause(self):
+        """Возвращает терминал в обычный режим (например, для Con)"""
+        if self.saved is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+            self.saved = None
+    
+    def stop(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.fd)
+            self.loop.close()
+            self.loop = None
+        self.pause()
+    
+    def on_readable(self):
+        try:
+            data = os.read(self.fd, 1024)
+        except OSError:
+            return
+        self.keys.extend(self.parse(self.decoder.decode(data)))
+        self.event.set()
+    
+    def parse(self, text):
+        """Разбирает ввод терминала на имена клавиш"""
+        keys = []
+        i = 0
+        while i < len(text):
+            char = text[i]
+            i += 1
+            if char == '\x1b':
+                if i < len(text) and text[i] in '[O':
+                    # CSI: параметры и завершающий символ @..~; SS3: один символ
+                    end = i + 1
+                    while text[i] == '[' and end < len(text) and not '@' <= text[end] <= '~':
+                        end += 1
+                    sequence = text[i:end + 1]
+                    i = end + 1
+                    keys.append(self.ESCAPES.get(sequence, "escape" + sequence))
+                elif i < len(text):
+                    keys.append("alt+" + self.key_name(text[i]))
+                    i += 1
+                else:
+                    keys.append("escape")
+            else:
+                keys.append(self.key_name(char))
+        return keys
+    
+    def key_name(self, char):
+        if char in self.SPECIAL:
+            return self.SPECIAL[char]
+        if char < ' ':
+            return "ctrl+" + chr(ord(char) + 96)
+        return char
+    
+    def write(self, text):
+        self.stream.write(text)
+        self.stream.flush()
+    
+    async def next_event(self, timeout):
+        self.event.clear()
+        try:
+            await self.asyncio.wait_for(self.event.wait(), timeout)
+        except self.asyncio.TimeoutError:
+            pass
+    
+    def take(self, key):
+        """Забирает клавишу из буфера, если она уже была нажата"""
+        for queue in (self.held, self.keys):
+            for pressed in queue:
+                if pressed.lower() == key:
+                    queue.remove(pressed)
+                    return True
+        return False
+    
+    def take_bound(self):
+        for pressed in self.keys:
+            if pressed.lower() in self.bindings:
+                self.keys.remove(pressed)
+                return pressed.lower()
+        return None
+    
+    def wait(self, seconds, run):
+        """Ждет seconds секунд, выполняя привязанные клавиши.
+        
+        run(клавиша) выполняет команду и возвращает False, если ожидание
+        надо прервать (Exit или переход в другую главу).
+        """
+        deadline = time.monotonic() + seconds
+        while True:
+            key = self.take_bound()
+            if key is not None:
+                if not run(key):
+                    return
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self.loop.run_until_complete(self.next_event(remaining))
+    
+    def read_line(self, prompt, run):
+        """Строка ввода с эхом и Backspace; привязанные клавиши срабатывают сразу"""
+        self.write(prompt)
+        chars = []
+        while True:
+            if not self.keys:
+                self.loop.run_until_complete(self.next_event(None))
+                continue
+            key = self.keys.popleft()
+            if key.lower() in self.bindings:
+                self.write("\n")
+                if not run(key.lower()):
+                    return "".join(chars)
+                self.write(prompt + "".join(chars))
+            elif key == "enter":
+                self.write("\n")
+                return "".join(chars)
+            elif key == "backspace":
+                if chars:
+                    chars.pop()
+                    self.write("\b \b")
+            elif key == "ctrl+d" and not chars:
+                self.write("\n")
+                raise EOFError
+            elif key == "space" or len(key) == 1:
+                char = " " if key == "space" else key
+                chars.append(char)
+                self.write(char)
+            else:
+                self.held.append(key)
+
+class ScriptCatalog:
+    """Кэш содержимого папки: имена и размеры файлов.
+    
+    Папка перечитывается только когда меняется ее mtime (файл создан,
+    удален или переименован), иначе проверка стоит один stat. Папке,
+    измененной меньше RACY_WINDOW секунд назад, не доверяем: при грубом
+    mtime (сетевые диски) следующее изменение в ту же секунду не было бы
+    замечено.
+    """
+    RACY_WINDOW = 2.0
+    
+    def __init__(self, directory, suffix=None):
+        self.directory = directory
+        self.suffix = suffix
+        self.mtime = None
+        self.exists = False
+        self.files = {}   # имя файла -> размер
+        self.lower = {}   # имя в нижнем регистре -> имя файла
+    
+    def invalidate(self):
+        self.mtime = None
+    
+    def refresh(self):
+        """Перечитывает папку, если она изменилась"""
+        try:
+            stat = os.stat(self.directory)
+        except OSError:
+            self.mtime = None
+            self.exists = False
+            self.files = {}
+            self.lower = {}
+            return self
+        if self.exists and stat.st_mtime_ns == self.mtime:
+            return self
+        
+        files = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if self.suffix and not entry.name.endswith(self.suffix):
+                        continue
+                    try:
+                        files[entry.name] = entry.stat().st_size
+                    except OSError:
+                        files[entry.name] = 0
+        except OSError:
+            files = {}
+        
+        self.exists = True
+        self.files = files
+        self.lower = {name.lower(): name for name in sorted(files, reverse=True)}
+        racy = time.time() - stat.st_mtime < self.RACY_WINDOW
+        self.mtime = None if racy else stat.st_mtime_ns
+        return self
+    
+    def names(self):
+        return sorted(self.refresh().files)
+    
+    def size(self, name):
+        return self.refresh().files.get(name, 0)
+    
+    def __len__(self):
+        return len(self.refresh().files)
+    
+    def resolve(self, name):
+        """Имя файла для !Run: как есть, с расширением, без учета регистра"""
+        files = self.refresh().files
+        candidates = [name]
+        if self.suffix and not name.lower().endswith(self.suffix):
+            candidates.append(name + self.suffix)
+        for candidate in candidates:
+            if candidate in files:
+                return candidate
+        for candidate in candidates:
+            if candidate.lower() in self.lower:
+                return self.lower[candidate.lower()]
+        return None
+
+class ZeroShell:
+    def __init__(self):
+        self.variables = {}
+        self.chapters = {}
+        self.symbols = SymbolTable()
+        self.current_chapter = None
+        self.chapter_stack = []  # стек возврата Call: (глава, команды, позиция)
+        self.max_call_depth = MAX_CALL_DEPTH
+        self.pending_jump = None  # переход Run/Call/Return для цикла выполнения
+        self.running = False
+        self.script_dir = "Scripts"
+        self.project_dir = None
+        self.should_exit = False
+        self.error = None      # сообщение об ошибке, прервавшей выполнение
+        self.use_cache = True  # кэш скомпилированных скриптов в Scripts/cache
+        self.lazy = False      # главы компилируются при первом входе (большие скрипты)
+        self.lazy_cache_size = 256
+        self.optimize = True   # проход оптимизации после компиляции (кроме lazy и watch)
+        self.native = False    # главы переводятся в функции Python (тоже кроме lazy и watch)
+        self.watch = False     # обновление измененных глав во время выполнения
+        self.watch_interval = 0.5
+        self.watch_checked = 0.0
+        self.script_path = None
+        self.script_stat = None
+        self.chapter_sources = {}  # глава -> ее строки (для сравнения при обновлении)
+        self.output = OutputBuffer()
+        self.files = FileWriter()  # фоновая запись save/append
+        self.readers = {}          # (команда read, глубина стека) -> открытый файл
+        self.input_lines = None    # сеанс сервера: очередь строк для Input
+        self.suspended = None      # (причина, значение), если выполнение приостановлено
+        self.resume_points = {}    # (команда, глубина стека) -> где продолжить после resume
+        self.output_full = False   # сеанс: клиент не успевает читать вывод
+        self.step_limit = None     # сеанс: переходов и повторов до передачи управления другим сеансам
+        self.steps_left = 0
+        self.input_func = input  # источник ответов для Input
+        self.replay = None       # Replay: ответы и клавиши из записи
+        self.recorder = None     # Recorder: запись сеанса
+        self.skip_wait = False   # Wait без ожидания (воспроизведение записи)
+        self.use_keyboard = True # If pressed через KeyboardLoop, если это терминал
+        self.keyboard = None     # KeyboardLoop во время выполнения скрипта
+        self.bindings = {}       # клавиша -> команда If pressed
+        self.random = random     # генератор для random (свой при записи)
+        self.profiler = None
+        self.debug = False  # отладочные сообщения (скорость rpl)
+        self.handlers = {op: getattr(self, "op_" + op) for op in OPCODES}
+        self.catalogs = {}  # путь папки -> ScriptCatalog
+        
+    def catalog(self, directory=None, suffix='.txt'):
+        """Кэшированный список файлов папки (по умолчанию - скриптов)"""
+        directory = directory or self.script_dir
+        key = (directory, suffix)
+        if key not in self.catalogs:
+            self.catalogs[key] = ScriptCatalog(directory, suffix)
+        return self.catalogs[key]
+    
+    def clear_screen(self):
+        """Очистка экрана"""
+        os.system('cls' if os.name == 'nt' else 'clear')
+        
+    def print_colored(self, text, color="white"):
+        """Вывод цветного текста"""
+        self.output.write_line(text, color)
+    
+    def render(self, template):
+        """Подставляет значения переменных в скомпилированный шаблон"""
+        if len(template) == 1:
+            return template[0]
+        get = self.variables.get
+        result = list(template)
+        result[1::2] = [to_text(get(name, "")) for name in template[1::2]]
+        return "".join(result)
+    
+    def parse_value(self, value_str):
+        """Парсит значение, подставляя переменные"""
+        if not value_str:
+            return ""
+        return self.render(compile_template(value_str, False))
+    
+    def parse_text(self, text):
+        """Парсит текст с фигурными скобками и переменными"""
+        if not text:
+            return ""
+        return self.render(compile_template(text))
+    
+    def tokenize(self, line):
+        """Разделяет команду на слова, но сохраняет строки в фигурных скобках"""
+        if '{' not in line and '}' not in line:
+            return [part for part in line.split(' ') if part]
+        
+        # Слово - кусок строки между пробелами вне скобок, берется срезом
+        parts = []
+        start = 0
+        in_braces = False
+        brace_depth = 0
+        for i, char in enumerate(line):
+            if char == '{':
+                in_braces = True
+                brace_depth += 1
+            elif char == '}':
+                brace_depth -= 1
+                if brace_depth == 0:
+                    in_braces = False
+            elif char == ' ' and not in_braces:
+                if i > start:
+                    parts.append(line[start:i])
+                start = i + 1
+        if start < len(line):
+            parts.append(line[start:])
+        return parts
+    
+    def compile_line(self, line):
+        """Компилирует строку скрипта в инструкцию (None - пустая строка или комментарий)"""
+        line = line.strip()
+        if not line:
+            return None
+            
+        # Удаляем комментарии
+        if '#' in line:
+            line = line.split('#')[0].strip()
+            if not line:
+                return None
+        
+        parts = self.tokenize(line)
+        if not parts:
+            return None
+        
+        return self.compile_parts(parts, line)
+    
+    def compile_parts(self, parts, source):
+        """Определяет код операции и заранее разбирает операнды команды"""
+        cmd = parts[0].lower()
+        
+        # Print: заранее разбираем Nline/Col и постоянные {...} строки
+        if cmd == "print":
+            segments = []
+            i = 1
+            while i < len(parts):
+                token = parts[i]
+                if token.lower() == "nline":
+                    segments.append(("nline", None))
+                elif token.lower() == "col" and i+1 < len(parts):
+                    i += 1
+                    segments.append(("col", parts[i]))
+                else:
+                    segments.append(("text", compile_template(token)))
+                i += 1
+            return Instruction("print", source, segments)
+        
+        # Input $var - подсказка L10
+        elif cmd == "input":
+            if len(parts) < 2:
+                return Instruction("nop", source)
+            
+            var_name = variable_name(parts[1])
+            
+            # Ищем подсказку после '-'
+            dash_found = False
+            prompt_parts = []
+            for i in range(2, len(parts)):
+                if parts[i] == '-':
+                    dash_found = True
+                elif dash_found:
+                    prompt_parts.append(parts[i])
+            
+            prompt = " ".join(prompt_parts)
+            limit = None
+            # Проверяем на лимит (L10)
+            for part in prompt_parts:
+                if part.lower().startswith('l') and part[1:].isdigit():
+                    limit = int(part[1:])
+                    break
+            return Instruction("input", source, (var_name, compile_template(prompt), limit))
+        
+        elif cmd == "chp":
+            if len(parts) > 1:
+                return Instruction("chp", source, parts[1])
+            return Instruction("nop", source)
+        
+        elif cmd == "end" and len(parts) > 1 and parts[1].lower() == "chp":
+            return Instruction("endchp", source)
+        
+        # Присваивание переменной
+        elif len(parts) >= 3 and parts[1] == '=':
+            var_name = parts[0]
+            if var_name.startswith('$'):
+                value = compile_template(" ".join(parts[2:]), False)
+                return Instruction("assign", source, (variable_name(var_name), value))
+            return Instruction("nop", source)
+        
+        elif cmd == "if":
+            # If pressed {клавиша} - команда
+            if len(parts) > 1 and parts[1].lower() == "pressed":
+                if len(parts) >= 4:
+                    key = parts[2].strip('{}')
+                    command = " ".join(parts[4:])
+                    return Instruction("pressed", source, (key, command, self.compile_line(command)))
+                return Instruction("nop", source)
+            
+            # if not found create папка
+            if len(parts) >= 5 and [p.lower() for p in parts[1:4]] == ["not", "found", "create"]:
+                return Instruction("mkdir", source, compile_template(" ".join(parts[4:])))
+            
+            # Формат: if $var = {значение} - команда
+            if len(parts) >= 4 and parts[2] == '=':
+                var_name = variable_name(parts[1])
+                
+                # Находим позицию '-'
+                dash_pos = parts.index('-') if '-' in parts else -1
+                if dash_pos > 3:
+                    value = compile_template(" ".join(parts[3:dash_pos]))
+                    command = " ".join(parts[dash_pos+1:])
+                    return Instruction("if", source, (var_name, value, self.compile_line(command)))
+            return Instruction("nop", source)
+        
+        # Формат: calc $a + $b - $result
+        elif cmd == "calc":
+            if len(parts) >= 5:
+                result_var = variable_name(parts[-1])
+                try:
+                    expr = compile_expression(" ".join(parts[1:-2]))
+                except ValueError:
+                    expr = None  # ошибка в выражении: результат всегда 0
+                return Instruction("calc", source, (expr, result_var))
+            return Instruction("nop", source)
+        
+        # Формат: rpl 10 команда / rpl $n команда
+        elif cmd == "rpl":
+            if len(parts) >= 3:
+                count, count_var = None, None
+                if parts[1].startswith('$'):
+                    count_var = variable_name(parts[1])
+                else:
+                    try:
+                        count = int(parts[1])
+                    except ValueError:
+                        return Instruction("nop", source)
+                command = self.compile_line(" ".join(parts[2:]))
+                lines = self.constant_output(command)
+                return Instruction("rpl", source, (count, count_var, command, lines))
+            return Instruction("nop", source)
+        
+        elif cmd == "wait":
+            if len(parts) > 1:
+                if parts[1].startswith('$'):
+                    return Instruction("wait", source, (None, variable_name(parts[1])))
+                try:
+                    return Instruction("wait", source, (float(parts[1]), None))
+                except ValueError:
+                    return Instruction("nop", source)
+            return Instruction("nop", source)
+        
+        elif cmd == "exit":
+            return Instruction("exit", source)
+        
+        elif cmd == "flush":
+            return Instruction("flush", source)
+        
+        # Формат: random 1,10 - $var
+        elif cmd == "random":
+            if len(parts) >= 4 and parts[2] == '-':
+                range_str = parts[1]
+                var_name = variable_name(parts[3])
+                
+                if ',' in range_str:
+                    items = [item.strip() for item in range_str.split(',')]
+                    # Если диапазон чисел
+                    if len(items) == 2:
+                        try:
+                            choice = ("range", int(items[0]), int(items[1]), items)
+                        except ValueError:
+                            choice = ("items", items)
+                    else:
+                        choice = ("items", items)
+                else:
+                    choice = ("const", range_str)
+                return Instruction("random", source, (var_name, choice))
+            return Instruction("nop", source)
+        
+        # Формат: save $var in Here - файл (append - дописать строку в конец)
+        elif cmd == "save" or cmd == "append":
+            if len(parts) >= 5:
+                var_name = variable_name(parts[1])
+                
+                # Ищем конструкцию "in ... - filename"
+                try:
+                    in_index = parts.index("in")
+                    dash_index = parts.index("-", in_index + 1)
+                except ValueError:
+                    return Instruction("nop", source)
+                location = parts[in_index + 1]
+                filename = compile_template(" ".join(parts[dash_index + 1:]))
+                return Instruction("save", source, (var_name, location, filename, cmd == "append"))
+            return Instruction("nop", source)
+        
+        # Формат: read $var in Here - файл [- команда для каждой строки]
+        elif cmd == "read":
+            if len(parts) >= 5 and parts[1].startswith('$'):
+                try:
+                    in_index = parts.index("in")
+                    dash_index = parts.index("-", in_index + 1)
+                except ValueError:
+                    return Instruction("nop", source)
+                rest = parts[dash_index + 2:]
+                if dash_index + 1 >= len(parts) or (rest and (rest[0] != "-" or len(rest) < 2)):
+                    return Instruction("nop", source)
+                location = parts[in_index + 1]
+                filename = compile_template(parts[dash_index + 1])
+                command = self.compile_line(" ".join(rest[1:])) if rest else None
+                return Instruction("read", source, (variable_name(parts[1]), location, filename, command))
+            return Instruction("nop", source)
+        
+        elif cmd == "con":
+            if len(parts) > 1:
+                return Instruction("con", source, " ".join(parts[1:]))
+            return Instruction("nop", source)
+        
+        elif cmd == "run" or cmd == "call":
+            if len(parts) > 1:
+                # Допускается форма "Run chp main"
+                target = parts[1]
+                if target.lower() == "chp" and len(parts) > 2:
+                    target = parts[2]
+                # [имя главы, ее команды после разрешения при загрузке]
+                return Instruction(cmd, source, [target, None])
+            return Instruction("nop", source)
+        
+        elif cmd == "return":
+            return Instruction("return", source)
+        
+        return Instruction("nop", source)
+    
+    def constant_output(self, instruction):
+        """Вывод команды, если она только печатает постоянный текст.
+        
+        Возвращает список строк (текст, цвет) для одного выполнения
+        или None, если команда зависит от переменных или делает что-то еще.
+        """
+        if instruction is None:
+            return None
+        if instruction.op == "print":
+            for kind, value in instruction.args:
+                if kind == "text" and len(value) > 1:
+                    return None
+            return [("" if text == "\n" else text, color)
+                    for text, color in self.print_lines(instruction.args)]
+        if instruction.op == "rpl":
+            count, count_var, command, lines = instruction.args
+            if count_var is None and lines is not None and len(lines) * count <= MAX_FOLDED_LINES:
+                return lines * max(count, 0)
+        return None
+    
+    def execute_command(self, line):
+        """Выполняет одну команду ZeroBasics (интерактивный ввод)"""
+        instruction = self.compile_line(line)
+        if instruction is None:
+            return True
+        return self.execute_instruction(instruction)
+    
+    def execute_instruction(self, instruction):
+        """Выполняет скомпилированную инструкцию"""
+        return self.handlers[instruction.op](instruction)
+    
+    def op_nop(self, instruction):
+        return True
+    
+    def print_lines(self, segments):
+        """Собирает строки вывода Print: список (текст, цвет)"""
+        output_lines = []
+        current_line = ""
+        current_color = None
+        
+        for kind, value in segments:
+            if kind == "nline":
+                if current_line:
+                    output_lines.append((current_line.strip(), current_color))
+                output_lines.append(("\n", None))
+                current_line = ""
+                current_color = None
+            elif kind == "col":
+                if current_line:
+                    output_lines.append((current_line.strip(), current_color))
+                    current_line = ""
+                current_color = value
+            else:
+                parsed_token = self.render(value)
+                if current_line:
+                    current_line += " " + parsed_token
+                else:
+                    current_line = parsed_token
+        
+        if current_line:
+            output_lines.append((current_line.strip(), current_color))
+        return output_lines
+    
+    def op_print(self, instruction):
+        write_line = self.output.write_line
+        for text, color in self.print_lines(instruction.args):
+            if text == "\n":
+                write_line("")
+            else:
+                write_line(text, color)
+        return True
+    
+    def op_echo(self, instruction):
+        """Print постоянного текста: строки вывода готовы при компиляции"""
+        write_line = self.output.write_line
+        for text, color in instruction.args:
+            write_line(text, color)
+        return True
+    
+    def op_input(self, instruction):
+        var_name, prompt, limit = instruction.args
+        prompt = self.render(prompt)
+        self.output.flush()
+        
+        if prompt:
+            user_input = self.read_input(prompt + " ")
+        else:
+            user_input = self.read_input("Ввод: ")
+        if user_input is None:
+            self.pending_jump = ("suspend", "input", None)
+            return True
+            
+        if limit and len(user_input) > limit:
+            user_input = user_input[:limit]
+        
+        self.variables[var_name] = user_input
+        return True
+    
+    def read_input(self, prompt):
+        """Строка ввода: от пользователя или из записи"""
+        if self.replay is not None:
+            self.replay_bindings()
+            value = self.replay.next_input()
+            self.output.write_line(prompt + value)
+            self.output.flush()
+        elif self.keyboard is not None:
+            value = self.keyboard.read_line(prompt, self.run_binding)
+        elif self.input_lines is not None:
+            if not self.input_lines:
+                # Ответа еще нет: показываем вопрос и ждем следующую строку сеанса
+                self.output.write_line(prompt)
+                return None
+            value = self.input_lines.popleft()
+        else:
+            value = self.input_func(prompt)
+        if self.recorder is not None:
+            self.recorder.record("input", value)
+        return value
+    
+    def key_pressed(self, key):
+        """Нажата ли клавиша для If pressed"""
+        if self.replay is not None:
+            pressed = self.replay.next_key(key)
+        else:
+            pressed = True
+        if pressed and self.recorder is not None:
+            self.recorder.record("pressed", key)
+        return pressed
+    
+    def run_binding(self, key):
+        """Выполняет команду If pressed для нажатой клавиши.
+        
+        Возвращает False, если ожидание Wait/Input надо прервать.
+        """
+        if self.recorder is not None:
+            self.recorder.record("pressed", key)
+        self.execute_instruction(self.bindings[key])
+        self.output.flush()
+        return not self.should_exit and self.pending_jump is None
+    
+    def replay_bindings(self):
+        """Воспроизведение: клавиши, нажатые во время Wait и Input.
+        
+        В записи они стоят перед ответом для Input (или следующим
+        событием после Wait); привязанные через If pressed выполняются
+        по порядку, как при записи.
+        """
+        while True:
+            event = self.replay.peek()
+            if event is None or event[0] != "pressed":
+                return
+            key = normalize_key(event[1])
+            if key not in self.bindings:
+                return
+            self.replay.take()
+            if not self.run_binding(key):
+                return
+    
+    def start_keyboard(self):
+        """Включает чтение клавиш без блокировки, если stdin - терминал"""
+        if not self.use_keyboard or self.replay is not None or self.input_func is not input:
+            return None
+        if not KeyboardLoop.available():
+            return None
+        self.keyboard = KeyboardLoop(self.output.stream)
+        self.keyboard.bindings = self.bindings
+        self.keyboard.start()
+        return self.keyboard
+    
+    def stop_keyboard(self):
+        if self.keyboard is not None:
+            self.keyboard.stop()
+            self.keyboard = None
+    
+    def start_replay(self, events, fast=True):
+        """Включает воспроизведение записи (Replay, список или генератор событий)"""
+        self.replay = events if isinstance(events, Replay) else Replay(events)
+        self.skip_wait = fast
+        event = self.replay.peek()
+        if event is not None and event[0] == "seed":
+            self.replay.take()
+            self.random = random.Random(int(event[1]))
+    
+    def start_recording(self, target):
+        """Начинает запись сеанса в файл или список"""
+        self.recorder = target if isinstance(target, Recorder) else Recorder(target)
+        seed = random.randrange(2 ** 32)
+        self.random = random.Random(seed)
+        self.recorder.record("seed", seed)
+    
+    def op_chp(self, instruction):
+        self.chapters[instruction.args] = []
+        self.symbols.add(instruction.args)
+        self.current_chapter = instruction.args
+        return True
+    
+    def op_endchp(self, instruction):
+        self.current_chapter = None
+        return True
+    
+    def op_assign(self, instruction):
+        var_name, value = instruction.args
+        self.variables[var_name] = self.render(value)
+        return True
+    
+    def op_if(self, instruction):
+        var_name, value, command = instruction.args
+        if to_text(self.variables.get(var_name, "")) == self.render(value):
+            if command is None:
+                return True
+            return self.execute_instruction(command)
+        return True
+    
+    def op_switch(self, instruction):
+        """Цепочка if $var = {значение} по одной переменной.
+        
+        Совпавший вариант ищется в таблице, а не сравнением каждой строки.
+        После его команды переменная читается заново, как если бы дальше
+        выполнялись следующие if цепочки.
+        """
+        var_name, table, cases = instruction.args
+        key = (instruction, len(self.chapter_stack))
+        start = self.resume_points.pop(key, 0)
+        get = self.variables.get
+        while True:
+            positions = table.get(to_text(get(var_name, "")))
+            if positions is None:
+                return True
+            index = next((position for position in positions if position >= start), None)
+            if index is None:
+                return True
+            start = index + 1
+            command = cases[index].args[2]
+            if command is None:
+                continue
+            if not self.execute_instruction(command):
+                return False
+            if self.pending_jump is not None:
+                kind = self.pending_jump[0]
+                if kind == "suspend":
+                    # После resume вариант, который ждал ввода, выполнится снова
+                    self.resume_points[key] = index
+                elif kind == "call":
+                    # После главы цепочка продолжается со следующего варианта
+                    self.pending_jump = ("loop",) + self.pending_jump[1:]
+                    self.resume_points[key] = index + 1
+                return True
+            if self.should_exit:
+                return True
+    
+    def op_native(self, instruction):
+        """Участок главы, переведенный в функцию Python (--native)"""
+        block = instruction.args[0]
+        return block.function(self, block.consts)
+    
+    def op_set(self, instruction):
+        """Присваивание значения, вычисленного при компиляции"""
+        var_name, value = instruction.args
+        self.variables[var_name] = value
+        return True
+    
+    def op_calc(self, instruction):
+        expr, result_var = instruction.args
+        try:
+            if expr is None:
+                raise ValueError("ошибка в выражении")
+            self.variables[result_var] = calc_result(expr.evaluate(self.variables))
+        except (ArithmeticError, ValueError, KeyError):
+            self.variables[result_var] = 0
+        return True
+    
+    def op_rpl(self, instruction):
+        count, count_var, command, lines = instruction.args
+        started = time.perf_counter()
+        done = 0
+        try:
+            if count_var is not None:
+                count = to_count(self.variables.get(count_var, 0))
+            
+            # Сеанс отдает цикл asyncio другим сеансам и между повторами
+            limited = self.step_limit is not None and self.running
+            key = (instruction, len(self.chapter_stack))
+            if lines is not None and limited:
+                # Постоянный текст выводится частями по размеру буфера
+                size = sum(len(text) + 1 for text, _ in lines)
+                portion = max(1, self.output.max_size // size)
+                done = self.resume_points.pop(key, 0)
+                while done < count:
+                    repeat = min(portion, count - done)
+                    self.output.write_repeated(lines, repeat)
+                    done += repeat
+                    # Каждый повтор считается шагом, как в цикле с командой
+                    self.steps_left -= repeat - 1
+                    reason = self.slice_over()
+                    if reason is not None and done < count:
+                        self.resume_points[key] = done
+                        self.pending_jump = ("suspend", reason, None)
+                        break
+            elif lines is not None:
+                # Тело только печатает постоянный текст: выводим все сразу
+                self.output.write_repeated(lines, count)
+                done = max(count, 0)
+            elif command is not None:
+                handler = self.handlers[command.op]
+                for done in range(self.resume_points.pop(key, 1), count + 1):
+                    if not handler(command):
+                        break
+                    if not done & 1023:
+                        # Долгий rpl: накопленный до него вывод не должен ждать конца
+                        self.output.poll()
+                    if limited and self.pending_jump is None:
+                        reason = self.slice_over()
+                        if reason is not None and done < count:
+                            self.resume_points[key] = done + 1
+                            self.pending_jump = ("suspend", reason, None)
+                            break
+                    if self.pending_jump is not None:
+                        kind = self.pending_jump[0]
+                        if kind == "suspend":
+                            self.resume_points[key] = done
+                        elif kind in ("call", "jump"):
+                            # Run/Call: после главы rpl выполняется снова со следующего повтора
+                            self.pending_jump = ("loop",) + self.pending_jump[1:]
+                            self.resume_points[key] = done + 1
+                        break
+        except:
+            pass
+        
+        if self.debug:
+            elapsed = time.perf_counter() - started
+            rate = done / elapsed if elapsed > 0 else float("inf")
+            self.output.write_line(f"[debug] {instruction.source}: {done} повторов за {elapsed:.6f} с ({rate:.0f} в секунду)")
+        return True
+    
+    def op_wait(self, instruction):
+        wait_time, wait_var = instruction.args
+        try:
+            if wait_var is not None:
+                wait_time = float(self.variables.get(wait_var, 0))
+            self.output.flush()
+            if self.replay is not None:
+                self.replay_bindings()
+            if self.skip_wait:
+                pass
+            elif self.input_lines is not None:
+                # Сеанс: ждет сервер, после resume команда выполняется снова и пропускается
+                key = (instruction, len(self.chapter_stack))
+                if self.resume_points.pop(key, None) is None:
+                    self.resume_points[key] = True
+                    self.pending_jump = ("suspend", "wait", wait_time)
+            elif self.keyboard is not None:
+                self.keyboard.wait(wait_time, self.run_binding)
+            else:
+                time.sleep(wait_time)
+        except:
+            pass
+        return True
+    
+    def op_exit(self, instruction):
+        self.flush_files()
+        self.output.flush()
+        self.should_exit = True
+        return False
+    
+    def op_pressed(self, instruction):
+        key, command_text, command = instruction.args
+        if self.keyboard is not None:
+            # Клавиша привязывается к команде и срабатывает во время Wait и Input;
+            # если она уже была нажата, команда выполняется сразу
+            key = normalize_key(key)
+            if command is None:
+                return True
+            self.bindings[key] = command
+            if self.keyboard.take(key):
+                self.run_binding(key)
+            return True
+        if self.input_lines is not None:
+            # В сеансе есть только строки ввода, нажатий клавиш нет
+            return True
+        if self.replay is not None and command is not None:
+            # Клавиша из записи, нажатая во время Wait или Input, выполнит эту команду
+            self.bindings[normalize_key(key)] = command
+        if self.replay is None:
+            # Упрощенная версия для демонстрации
+            self.output.write_line(f"Для тестирования: предполагается нажатие клавиши {key}")
+            self.output.write_line(f"Выполняем команду: {command_text}")
+        if not self.key_pressed(key) or command is None:
+            return True
+        return self.execute_instruction(command)
+    
+    def op_random(self, instruction):
+        var_name, (kind, *choice) = instruction.args
+        if kind == "range":
+            try:
+                result = self.random.randint(choice[0], choice[1])
+            except ValueError:
+                result = self.random.choice(choice[2])
+        elif kind == "items":
+            result = self.random.choice(choice[0])
+        else:
+            result = choice[0]
+        
+        self.variables[var_name] = result
+        return True
+    
+    def file_path(self, location, filename):
+        """Путь файла для save: Here - папка проекта скрипта"""
+        if location.lower() == "here":
+            if self.project_dir:
+                return os.path.join(self.project_dir, filename)
+            return filename
+        return os.path.join(location, filename)
+    
+    def op_save(self, instruction):
+        var_name, location, filename, append = instruction.args
+        save_path = self.file_path(location, self.render(filename))
+        text = to_text(self.variables.get(var_name, ""))
+        if append:
+            self.files.submit("append", save_path, text + "\n")
+        else:
+            self.files.submit("replace", save_path, text)
+            self.output.write_line(f"Сохранено: {save_path}")
+        return True
+    
+    def read_path(self, location, filename):
+        """Путь файла для read: только внутри папки проекта (None - нельзя)"""
+        base = self.project_dir or os.getcwd()
+        folder = base if location.lower() == "here" else os.path.join(base, location)
+        path = os.path.join(folder, filename)
+        real_base = os.path.realpath(base)
+        try:
+            inside = os.path.commonpath([real_base, os.path.realpath(path)]) == real_base
+        except ValueError:
+            # Windows: файл на другом диске
+            inside = False
+        if not inside:
+            self.output.write_line(f"Ошибка: файл {filename} вне папки проекта")
+            return None
+        return path
+    
+    def op_read(self, instruction):
+        """read - построчное чтение файла в переменную.
+        
+        Без команды переменная получает весь файл. С командой Run/Call
+        глава выполняется для каждой строки: переход возвращается к этой
+        же команде read, и она читает следующую строку, поэтому в памяти
+        всегда одна строка. Остальные команды выполняются в цикле, как в rpl.
+        """
+        var_name, location, filename, command = instruction.args
+        key = (instruction, len(self.chapter_stack))
+        f = self.readers.pop(key, None)
+        if f is None:
+            path = self.read_path(location, self.render(filename))
+            if path is None:
+                return True
+            # Файл мог быть только что записан через save
+            self.flush_files()
+            try:
+                f = open(path, 'r', encoding='utf-8', errors='replace')
+            except OSError:
+                self.output.write_line(f"Ошибка чтения файла: {path}")
+                return True
+            if command is None:
+                with f:
+                    self.variables[var_name] = f.read()
+                return True
+        
+        if command.op in ("run", "call"):
+            target = self.find_chapter(command)
+            if target is None:
+                f.close()
+                return True
+            if self.running:
+                line = f.readline(MAX_READ_LINE)
+                if not line:
+                    f.close()
+                    return True
+                self.readers[key] = f
+                self.variables[var_name] = line.rstrip('\n')
+                self.pending_jump = ("loop",) + target
+                return True
+        
+        handler = self.handlers[command.op]
+        repeat = self.resume_points.pop(key, None)
+        lines = 0
+        try:
+            while True:
+                if repeat is None:
+                    line = f.readline(MAX_READ_LINE)
+                    if not line:
+                        break
+                    self.variables[var_name] = line.rstrip('\n')
+                repeat = None
+                lines += 1
+                if not lines & 1023:
+                    self.output.poll()
+                if command.op in ("run", "call"):
+                    # Команда оболочки: глава выполняется отдельно для каждой строки
+                    self.execute_chapter(target[0])
+                elif not handler(command):
+                    break
+                if self.pending_jump is not None and self.pending_jump[0] == "suspend":
+                    # Сеанс: после resume та же строка обрабатывается снова
+                    self.readers[key] = f
+                    self.resume_points[key] = True
+                    f = None
+                    break
+                if self.step_limit is not None and self.running and self.pending_jump is None:
+                    reason = self.slice_over()
+                    if reason is not None:
+                        # Сеанс: после resume читается следующая строка
+                        self.readers[key] = f
+                        self.pending_jump = ("suspend", reason, None)
+                        f = None
+                        break
+                if self.should_exit or self.pending_jump is not None:
+                    break
+        finally:
+            if f is not None:
+                f.close()
+        return True
+    
+    def op_flush(self, instruction):
+        """Flush - дождаться записи всех файлов"""
+        self.flush_files()
+        return True
+    
+    def flush_files(self):
+        for error in self.files.flush():
+            self.output.write_line(f"Ошибка записи файла: {error}")
+    
+    def op_mkdir(self, instruction):
+        folder_name = self.render(instruction.args)
+        if not os.path.exists(folder_name):
+            os.makedirs(folder_name, exist_ok=True)
+            self.output.write_line(f"Создана папка: {folder_name}")
+        return True
+    
+    def op_con(self, instruction):
+        system_cmd = instruction.args
+        if system_cmd.startswith('!'):
+            # Команда может читать файлы, только что записанные через save
+            self.flush_files()
+            self.output.flush()
+            if self.keyboard is not None:
+                self.keyboard.pause()
+            try:
+                os.system(system_cmd[1:])
+            finally:
+                if self.keyboard is not None:
+                    self.keyboard.resume()
+        return True
+    
+    def find_chapter(self, instruction):
+        """Имя и команды главы - цели Run/Call (None, если главы нет)"""
+        name, code = instruction.args
+        if code is not None:
+            return name, code
+        name = self.symbols.resolve(name) or name
+        if name in self.chapters:
+            return name, self.chapters[name]
+        return None
+    
+    def op_run(self, instruction):
+        """Run - переход в главу без возврата"""
+        target = self.find_chapter(instruction)
+        if target is not None:
+            if not self.running:
+                return self.execute_chapter(target[0])
+            self.pending_jump = ("jump",) + target
+        return True
+    
+    def op_call(self, instruction):
+        """Call - вызов главы с возвратом к следующей команде"""
+        target = self.find_chapter(instruction)
+        if target is not None:
+            if not self.running:
+                return self.execute_chapter(target[0])
+            self.pending_jump = ("call",) + target
+        return True
+    
+    def op_return(self, instruction):
+        """Return - досрочный выход из главы"""
+        if self.running:
+            self.pending_jump = ("return", None, None)
+        return True
+    
+    def execute_chapter(self, chapter_name):
+        """Выполняет главу и все переходы из неё в одном цикле, без рекурсии"""
+        if chapter_name not in self.chapters:
+            return False
+        
+        self.chapter_stack.clear()
+        self.resume_points.clear()
+        self.error = None
+        self.current_chapter = chapter_name
+        return self.run_code(self.chapters[chapter_name], 0)
+    
+    def resume(self):
+        """Продолжает выполнение, приостановленное в сеансе (Input, Wait, вывод)"""
+        self.suspended = None
+        self.current_chapter, code, pc = self.chapter_stack.pop()
+        return self.run_code(code, pc)
+    
+    def run_code(self, code, pc):
+        """Цикл выполнения: True/False - скрипт закончился, None - приостановлен.
+        
+        Приостановка бывает только в сеансе (input_lines не None): Input без
+        ответа и Wait возвращают переход suspend, команда кладется в стек и
+        после resume выполняется снова; rpl и read запоминают, где
+        остановились, в resume_points.
+        """
+        self.running = True
+        self.pending_jump = None
+        try:
+            while True:
+                if pc >= len(code):
+                    # Конец главы: возвращаемся к вызвавшей главе или завершаем
+                    if not self.chapter_stack:
+                        return True
+                    if self.watch and self.script_changed():
+                        self.reload_script()
+                    self.current_chapter, code, pc = self.chapter_stack.pop()
+                    continue
+                
+                instruction = code[pc]
+                pc += 1
+                if not self.execute_instruction(instruction):
+                    return False
+                if self.should_exit:
+                    return False
+                if self.pending_jump is None:
+                    continue
+                
+                kind, target, target_code = self.pending_jump
+                self.pending_jump = None
+                if kind == "suspend":
+                    self.chapter_stack.append((self.current_chapter, code, pc - 1))
+                    self.suspended = (target, target_code)
+                    return None
+                if self.watch and self.script_changed():
+                    # Текущая глава на время замены лежит в стеке и сохраняет старые команды
+                    self.chapter_stack.append((self.current_chapter, code, pc))
+                    self.reload_script()
+                    self.current_chapter, code, pc = self.chapter_stack.pop()
+                    if kind != "return":
+                        target = self.symbols.resolve(target)
+                        if target is None:
+                            continue
+                        target_code = self.chapters[target]
+                # Цикл из глав может долго ничего не печатать
+                self.output.poll()
+                if kind == "return":
+                    pc = len(code)
+                    continue
+                if kind == "call" or kind == "loop":
+                    if len(self.chapter_stack) >= self.max_call_depth:
+                        self.error = f"превышена глубина вызовов ({self.max_call_depth}) в главе {target}"
+                        self.output.write_line(f"Ошибка: {self.error}")
+                        return False
+                    # loop (read): после главы снова выполняется та же команда
+                    self.chapter_stack.append((self.current_chapter, code, pc if kind == "call" else pc - 1))
+                self.current_chapter = target
+                code = target_code
+                pc = 0
+                if self.step_limit is not None:
+                    reason = self.slice_over()
+                    if reason is not None:
+                        self.chapter_stack.append((self.current_chapter, code, pc))
+                        self.suspended = (reason, None)
+                        return None
+        finally:
+            self.running = False
+            self.pending_jump = None
+            if self.suspended is None:
+                self.close_readers()
+            if self.suspended is None or self.suspended[0] not in ("yield", "drain"):
+                # Короткие паузы сеанса не ждут записи файлов
+                self.flush_files()
+            self.output.flush()
+    
+    def slice_over(self):
+        """Сеанс: причина уступить цикл asyncio другим сеансам или None.
+        
+        drain - клиент не успевает читать вывод, yield - выполнено
+        step_limit переходов и повторов rpl/read подряд.
+        """
+        if self.output_full:
+            return "drain"
+        self.steps_left -= 1
+        if self.steps_left > 0:
+            return None
+        self.steps_left = self.step_limit
+        return "yield"
+    
+    def close_readers(self):
+        for f in self.readers.values():
+            f.close()
+        self.readers.clear()
+        self.resume_points.clear()
+    
+    def load_script(self, filename):
+        """Загружает и парсит скрипт"""
+        # Сбрасываем состояние (новые словари: старые мог передать run_program)
+        self.variables = {}
+        if isinstance(self.chapters, LazyChapters):
+            self.chapters.close()
+        self.chapters = {}
+        self.symbols = SymbolTable()
+        self.current_chapter = None
+        self.chapter_stack.clear()
+        self.bindings.clear()
+        self.should_exit = False
+        
+        # Полный путь к файлу
+        filepath = os.path.join(self.script_dir, filename)
+        if not os.path.exists(filepath):
+            # Пробуем добавить .txt если не указано расширение
+            if not filename.lower().endswith('.txt'):
+                filepath_txt = os.path.join(self.script_dir, filename + '.txt')
+                if os.path.exists(filepath_txt):
+                    filepath = filepath_txt
+                else:
+                    print(f"Файл {filename} не найден в {self.script_dir}")
+                    return False
+            else:
+                print(f"Файл {filename} не найден в {self.script_dir}")
+                return False
+        
+        self.script_path = filepath
+        self.chapter_sources = {}
+        
+        # Папка проекта создается при первой записи в нее (save, append)
+        script_name = os.path.splitext(os.path.basename(filepath))[0]
+        self.project_dir = os.path.join(self.script_dir, "projects", script_name)
+        
+        # Большой скрипт: только находим главы, команды - при первом входе
+        if self.lazy and os.path.getsize(filepath) > 0:
+            try:
+                self.chapters = LazyChapters(filepath, self.compile_line, self.lazy_cache_size)
+            except (OSError, ValueError):
+                print(f"Ошибка чтения файла: {filename}")
+                return False
+            self.symbols = self.chapters.symbols
+            for message in self.symbols.diagnostics:
+                print(f"Предупреждение: {message}")
+            return True
+        
+        # Читаем скрипт
+        try:
+            stat = os.stat(filepath)
+            program = self.load_cached(script_name, stat)
+            if program is None:
+                with open(filepath, 'rb') as f:
+                    data = f.read()
+                lines = io.StringIO(data.decode('utf-8'), newline=None).readlines()
+        except:
+            print(f"Ошибка чтения файла: {filename}")
+            return False
+        
+        if program is None:
+            digest = self.source_digest(data)
+            program = self.load_cached(script_name, stat, digest)
+            if program is None:
+                program = self.parse_script(lines)
+            self.save_cached(script_name, stat, digest, program)
+        
+        chapters, self.symbols = program
+        self.chapters.update(chapters)
+        for message in self.symbols.diagnostics:
+            print(f"Предупреждение: {message}")
+        if self.watch:
+            self.script_stat = (stat.st_mtime_ns, stat.st_size)
+            self.chapter_sources = self.read_sources()[0]
+        return True
+    
+    def read_sources(self):
+        """Строки глав текущего скрипта: (имя -> кортеж строк, главы, символы)"""
+        with open(self.script_path, 'rb') as f:
+            data = f.read()
+        lines = io.StringIO(data.decode('utf-8'), newline=None).readlines()
+        sections, symbols = self.split_script(lines)
+        sources = {name: tuple(line for _, line in section) for name, section in sections.items()}
+        return sources, sections, symbols
+    
+    def script_changed(self):
+        """Изменился ли файл скрипта (проверяется не чаще watch_interval)"""
+        if not self.chapter_sources:
+            return False
+        now = time.monotonic()
+        if now - self.watch_checked < self.watch_interval:
+            return False
+        self.watch_checked = now
+        try:
+            stat = os.stat(self.script_path)
+        except OSError:
+            return False
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self.script_stat:
+            return False
+        self.script_stat = key
+        return True
+    
+    def reload_script(self):
+        """Перекомпилирует изменившиеся главы, не трогая переменные.
+        
+        Изменившаяся глава обновляется на месте (code[:] = ...), поэтому
+        связанные с ней Run/Call сразу видят новые команды. Главы в стеке
+        возврата дочитывают старые команды до конца.
+        """
+        try:
+            sources, sections, symbols = self.read_sources()
+        except (OSError, UnicodeDecodeError):
+            return False
+        
+        changed = []
+        for name, section in sections.items():
+            code = self.chapters.get(name)
+            if code is not None and self.chapter_sources.get(name) == sources[name]:
+                # Текст тот же, могли сдвинуться номера строк
+                for (line_num, _), instruction in zip(section, code):
+                    instruction.set_line(line_num)
+                continue
+            new_code = self.compile_section(section)
+            if code is None:
+                self.chapters[name] = new_code
+            else:
+                self.detach_frames(code)
+                code[:] = new_code
+            changed.append(name)
+        removed = [name for name in self.chapters if name not in sections]
+        for name in removed:
+            self.detach_frames(self.chapters.pop(name))
+        
+        self.symbols = symbols
+        self.link_jumps(self.chapters, symbols)
+        self.chapter_sources = sources
+        
+        self.output.write_line(f"[Скрипт обновлен: изменено глав {len(changed)}, удалено {len(removed)}]", "cyan")
+        for message in symbols.diagnostics:
+            self.output.write_line(f"Предупреждение: {message}")
+        return True
+    
+    def detach_frames(self, code):
+        """Отдает кадрам стека копию старых команд главы перед ее заменой"""
+        old = None
+        for i, (chapter, frame_code, pc) in enumerate(self.chapter_stack):
+            if frame_code is code:
+                if old is None:
+                    old = list(code)
+                self.chapter_stack[i] = (chapter, old, pc)
+    
+    def parse_script(self, lines):
+        """Делит строки скрипта на главы и компилирует команды.
+        
+        Возвращает словарь глав и таблицу символов. Цели Run/Call
+        сразу связываются со списками команд своих глав.
+        """
+        sections, symbols = self.split_script(lines)
+        chapters = {name: self.compile_section(section) for name, section in sections.items()}
+        self.link_jumps(chapters, symbols)
+        if self.optimizing():
+            self.optimize_program(chapters, symbols)
+        if self.native_code():
+            # На месте: на списки команд уже ссылаются связанные переходы
+            for code in chapters.values():
+                code[:] = CodeGenerator().compile_code(code)
+        return chapters, symbols
+    
+    def split_script(self, lines):
+        """Делит строки скрипта на главы без компиляции.
+        
+        Возвращает словарь имя главы -> [(номер строки, строка)] и таблицу символов.
+        """
+        sections = {}
+        symbols = SymbolTable()
+        current_chapter = None
+        last_chapter = None  # последняя новая глава, для команд вне глав
+        for line_num, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            
+            # Проверяем комментарии
+            if line.startswith('#'):
+                continue
+            
+            # Проверяем начало главы
+            if line.lower().startswith("chp "):
+                chapter_name = line[4:].strip()
+                current_chapter = chapter_name
+                if chapter_name not in sections:
+                    last_chapter = chapter_name
+                sections[current_chapter] = []
+                symbols.add(chapter_name, line_num)
+            # Проверяем конец главы
+            elif line.lower() == "end chp":
+                if current_chapter is not None:
+                    symbols.extend(current_chapter, line_num)
+                current_chapter = None
+            # Добавляем команду в текущую главу
+            elif current_chapter is not None:
+                sections[current_chapter].append((line_num, line))
+                symbols.extend(current_chapter, line_num)
+            # Если команды вне главы, создаем главу "main"
+            elif not sections:
+                current_chapter = last_chapter = "main"
+                sections[current_chapter] = [(line_num, line)]
+                symbols.add(current_chapter, line_num)
+            else:
+                # Если уже есть главы, добавляем в последнюю
+                sections[last_chapter].append((line_num, line))
+                symbols.extend(last_chapter, line_num)
+        return sections, symbols
+    
+    def compile_section(self, section):
+        """Компилирует строки одной главы"""
+        code = []
+        for line_num, line in section:
+            instruction = self.compile_line(line)
+            if instruction is None:
+                continue
+            instruction.set_line(line_num)
+            code.append(instruction)
+        return code
+    
+    def jump_instructions(self, chapters):
+        """Все команды Run/Call глав, включая вложенные в if и rpl"""
+        pending = [instruction for code in chapters.values() for instruction in code]
+        while pending:
+            instruction = pending.pop()
+            pending.extend(instruction.children())
+            if instruction.op in ("run", "call"):
+                yield instruction
+    
+    def link_jumps(self, chapters, symbols, report=True):
+        """Связывает Run/Call с командами целевых глав, отмечая неизвестные цели"""
+        for instruction in self.jump_instructions(chapters):
+            name = symbols.resolve(instruction.args[0])
+            if name is None:
+                instruction.args[1] = None
+                if report:
+                    symbols.diagnostics.append(
+                        f"строка {instruction.line}: глава {instruction.args[0]} не найдена ({instruction.source})")
+            else:
+                instruction.args[:] = [name, chapters[name]]
+    
+    def optimizing(self):
+        """Оптимизировать ли загружаемые скрипты.
+        
+        В режиме watch главы обновляются построчно, поэтому команды
+        должны соответствовать строкам файла один к одному; в ленивом
+        режиме главы компилируются по одной и программы целиком нет.
+        """
+        return self.optimize and not self.watch and not self.lazy
+    
+    def native_code(self):
+        """Переводить ли главы в функции Python (при тех же условиях, что и оптимизацию)"""
+        return self.native and not self.watch and not self.lazy
+    
+    def optimize_program(self, chapters, symbols):
+        """Оптимизирует скомпилированный скрипт на месте.
+        
+        Постоянные Print, calc, random и присваивания вычисляются заранее,
+        подряд идущие if по одной переменной сливаются в switch, главы,
+        в которые не ведет ни один Run/Call, удаляются. Списки команд
+        меняются на месте: на них уже ссылаются связанные переходы.
+        """
+        for code in chapters.values():
+            code[:] = self.fuse_conditions([self.fold_constants(instruction) for instruction in code])
+        return self.drop_unreachable(chapters, symbols)
+    
+    def fold_constants(self, instruction):
+        """Команда с заранее вычисленным результатом или та же команда"""
+        op, args = instruction.op, instruction.args
+        value = folded = None
+        if op == "print":
+            lines = self.constant_output(instruction)
+            if lines is not None:
+                folded = Instruction("echo", instruction.source, tuple(lines), instruction.line)
+        elif op == "assign":
+            if len(args[1]) == 1:
+                folded = args[0], args[1][0]
+        elif op == "calc":
+            expr, result_var = args
+            # Степень не вычисляем заранее: 9 ** 9 ** 9 задержал бы загрузку
+            if expr is None or ('$' not in expr.text and '**' not in expr.text):
+                try:
+                    if expr is None:
+                        raise ValueError("ошибка в выражении")
+                    value = calc_result(expr.evaluate({}))
+                except (ArithmeticError, ValueError):
+                    value = 0
+                folded = result_var, value
+        elif op == "random":
+            var_name, (kind, *choice) = args
+            if kind == "const":
+                folded = var_name, choice[0]
+            elif kind == "range" and choice[0] == choice[1]:
+                folded = var_name, choice[0]
+            elif kind == "items" and len(set(choice[0])) == 1:
+                folded = var_name, choice[0][0]
+        elif op in ("if", "pressed", "read", "rpl"):
+            # Вложенная команда (тело rpl с готовым выводом уже свернуто)
+            index = 2 if op == "rpl" else len(args) - 1
+            command = args[index]
+            if command is not None and not (op == "rpl" and args[3] is not None):
+                command = self.fold_constants(command)
+                if command is not args[index]:
+                    instruction.args = args[:index] + (command,) + args[index + 1:]
+        if isinstance(folded, tuple):
+            folded = Instruction("set", instruction.source, folded, instruction.line)
+        return folded or instruction
+    
+    def fuse_conditions(self, code):
+        """Сливает подряд идущие if $var = {постоянное значение} в switch"""
+        def literal_if(instruction):
+            return instruction.op == "if" and len(instruction.args[1]) == 1
+        
+        fused = []
+        i = 0
+        while i < len(code):
+            j = i
+            if literal_if(code[i]):
+                var_name = code[i].args[0]
+                while j < len(code) and literal_if(code[j]) and code[j].args[0] == var_name:
+                    j += 1
+            if j - i < 2:
+                fused.append(code[i])
+                i += 1
+                continue
+            cases = tuple(code[i:j])
+            table = {}
+            for index, case in enumerate(cases):
+                table.setdefault(case.args[1][0], []).append(index)
+            table = {value: tuple(positions) for value, positions in table.items()}
+            source = "; ".join(case.source for case in cases)
+            fused.append(Instruction("switch", source, (var_name, table, cases), cases[0].line))
+            i = j
+        return fused
+    
+    def drop_unreachable(self, chapters, symbols):
+        """Удаляет главы, недостижимые из первой через Run/Call; возвращает их имена"""
+        if symbols.entry not in chapters:
+            return []
+        reached = {symbols.entry}
+        pending = [symbols.entry]
+        while pending:
+            name = pending.pop()
+            for instruction in self.jump_instructions({name: chapters[name]}):
+                target = instruction.args[0]
+                if instruction.args[1] is not None and target not in reached:
+                    reached.add(target)
+                    pending.append(target)
+        removed = [name for name in chapters if name not in reached]
+        for name in removed:
+            del chapters[name]
+            symbols.remove(name)
+        return removed
+    
+    def describe(self, instruction):
+        """Текст команды для дампа программы"""
+        op, args = instruction.op, instruction.args
+        if op == "echo":
+            return "  ".join(repr(text) + (f" [{color}]" if color else "") for text, color in args)
+        if op == "set":
+            return f"${args[0]} = {args[1]!r}"
+        if op == "switch":
+            return f"${args[0]}: {len(args[2])} вариантов, {len(args[1])} значений"
+        if op == "native":
+            return f"{len(args[1])} команд в функции Python"
+        return instruction.source
+    
+    def dump_program(self):
+        """Строки дампа загруженного скрипта после оптимизации"""
+        code_count = sum(len(code) for code in self.chapters.values())
+        lines = [
+            "=" * 60,
+            f"ПРОГРАММА: {len(self.chapters)} глав, {code_count} команд"
+            + ("" if self.optimizing() else " (без оптимизации)")
+            + (", функции Python" if self.native_code() else ""),
+            "=" * 60,
+        ]
+        for name, code in self.chapters.items():
+            first, last = self.symbols.lines.get(name, (0, 0))
+            start = " - начало" if name == self.symbols.entry else ""
+            lines.append(f"Chp {name} (строки {first}-{last}{start})")
+            for instruction in code:
+                lines.append(f"{instruction.line:6}  {instruction.op:8} {self.describe(instruction)}")
+                if instruction.op == "switch":
+                    for case in instruction.args[2]:
+                        command = case.args[2]
+                        action = self.describe(command) if command is not None else "-"
+                        lines.append(f"{case.line:6}  {'':8}   {{{case.args[1][0]}}} -> {action}")
+                elif instruction.op == "native":
+                    lines.extend(f"{'':8}| {line}" for line in instruction.args[0].source.splitlines())
+        if self.symbols.removed:
+            lines.append("-" * 60)
+            lines.append("Удалены недостижимые главы:")
+            for name, (first, last) in self.symbols.removed.items():
+                lines.append(f"  {name} (строки {first}-{last})")
+        return lines
+    
+    def source_digest(self, data):
+        """Ключ кэша: хэш текста скрипта и версии интерпретатора"""
+        import hashlib
+        
+        key = hashlib.sha256(f"{VERSION}/{BYTECODE_VERSION}\n".encode('utf-8'))
+        key.update(data)
+        return key.hexdigest()
+    
+    def cache_path(self, script_name):
+        return os.path.join(self.script_dir, "cache", script_name + ".zbc")
+    
+    def load_cached(self, script_name, stat, digest=None):
+        """Скомпилированные главы и таблица символов из кэша или None.
+        
+        Без digest запись подходит, если совпадают размер и время изменения
+        файла. С digest - если совпадает хэш (файл могли просто перезаписать).
+        """
+        if not self.use_cache:
+            return None
+        # Сборщик мусора заметно замедляет распаковку тысяч объектов
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(self.cache_path(script_name), 'rb') as f:
+                entry = pickle.load(f)
+        except Exception:
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if not isinstance(entry, dict) or entry.get("version") != (VERSION, BYTECODE_VERSION):
+            return None
+        if entry.get("mode") != (self.optimizing(), self.native_code()):
+            return None
+        if digest is None:
+            if (entry["mtime"], entry["size"]) != (stat.st_mtime_ns, stat.st_size):
+                return None
+        elif entry["digest"] != digest:
+            return None
+        chapters, symbols = entry["program"]
+        self.link_jumps(chapters, symbols, report=False)
+        return chapters, symbols
+    
+    def save_cached(self, script_name, stat, digest, program):
+        """Сохраняет скомпилированные главы (ошибки записи не мешают запуску)"""
+        if not self.use_cache:
+            return
+        entry = {
+            "version": (VERSION, BYTECODE_VERSION),
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "digest": digest,
+            "mode": (self.optimizing(), self.native_code()),
+            "program": program,
+        }
+        # Цели переходов сохраняются только именами: связанные списки глав
+        # превратили бы цепочку Run в рекурсию глубиной в число глав
+        chapters = program[0]
+        linked = [instruction for instruction in self.jump_instructions(chapters) if instruction.args[1] is not None]
+        for instruction in linked:
+            instruction.args[1] = None
+        path = self.cache_path(script_name)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = make_temp(path)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            # Недописанный файл кэша не оставляем
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        finally:
+            for instruction in linked:
+                instruction.args[1] = chapters[instruction.args[0]]
+    
+    def memory_report(self, limit=20):
+        """Строки отчета: сколько байт занимают главы и переменные.
+        
+        Общие объекты (имена переменных, одинаковые шаблоны) считаются
+        один раз - в первой главе, где встретились. Каждая переменная
+        считается отдельно от глав и других переменных, целиком. В ленивом
+        режиме учитываются только разобранные главы.
+        """
+        if isinstance(self.chapters, LazyChapters):
+            chapters = dict(self.chapters.cache)
+            chapters.update(self.chapters.fixed)
+        else:
+            chapters = self.chapters
+        # Списки глав не считаем внутри Run/Call, которые на них ссылаются
+        seen = {id(code) for code in chapters.values()}
+        chapter_sizes = []
+        for name, code in chapters.items():
+            size = sys.getsizeof(code) + sum(object_size(instruction, seen) for instruction in code)
+            chapter_sizes.append((size, name, len(code)))
+        variable_sizes = []
+        for name, value in self.variables.items():
+            # Свой seen: имя и малые числа встречаются и в главах
+            own = set()
+            variable_sizes.append((object_size(name, own) + object_size(value, own), name))
+        chapter_sizes.sort(reverse=True)
+        variable_sizes.sort(reverse=True)
+        
+        chapters_total = sum(size for size, _, _ in chapter_sizes)
+        variables_total = sum(size for size, _ in variable_sizes)
+        commands = sum(count for _, _, count in chapter_sizes)
+        lines = [
+            "=" * 60,
+            f"ПАМЯТЬ: главы {chapters_total} байт ({len(chapter_sizes)} глав, {commands} команд), "
+            f"переменные {variables_total} байт ({len(variable_sizes)})",
+            "=" * 60,
+            f"{'Глава':30} {'байт':>10} {'команд':>8} {'байт/команда':>13}",
+        ]
+        for size, name, count in chapter_sizes[:limit]:
+            lines.append(f"{name[:30]:30} {size:10} {count:8} {size // max(count, 1):13}")
+        if variable_sizes:
+            lines.append("-" * 60)
+            lines.append(f"{'Переменная':30} {'байт':>10}")
+            for size, name in variable_sizes[:limit]:
+                lines.append(f"{'$' + name[:29]:30} {size:10}")
+        return lines
+    
+    def enable_profiler(self):
+        """Включает профилирование и возвращает Profiler с результатами"""
+        self.profiler = Profiler(self)
+        self.profiler.install()
+        return self.profiler
+    
+    def disable_profiler(self):
+        """Возвращает обработчики команд без замеров"""
+        self.handlers = {op: getattr(self, "op_" + op) for op in OPCODES}
+    
+    def run_script(self, filename):
+        """Запускает скрипт"""
+        print(f"\nЗагрузка скрипта: {filename}")
+        print("=" * 50)
+        
+        if not self.load_script(filename):
+            print(f"Не удалось загрузить скрипт: {filename}")
+            return False
+        
+        if not self.chapters:
+            print("Скрипт не содержит команд")
+            return False
+        
+        # Запускаем первую главу
+        self.start_keyboard()
+        try:
+            result = self.execute_chapter(self.symbols.entry)
+        finally:
+            self.stop_keyboard()
+        
+        print("=" * 50)
+        return result
+    
+    def use_program(self, program, variables=None):
+        """Делает Program текущим скриптом оболочки (без загрузки файлов)"""
+        self.variables = variables if variables is not None else {}
+        self.chapters = program.chapters
+        self.symbols = program.symbols
+        self.current_chapter = None
+        self.chapter_stack.clear()
+        self.bindings.clear()
+        self.should_exit = False
+        self.suspended = None
+    
+    def run_program(self, program, variables=None, input=None, output=None):
+        """Выполняет скомпилированный Program без файлов и баннеров.
+        
+        variables - словарь переменных, меняется на месте (по умолчанию
+        новый); input(prompt) возвращает ответ для Input, output(text)
+        получает вывод. Возвращает словарь переменных после выполнения.
+        """
+        self.use_program(program, variables)
+        saved = self.input_func, self.output.stream
+        if input is not None:
+            self.input_func = input
+        if output is not None:
+            self.output.flush()
+            self.output.stream = CallbackStream(output)
+        try:
+            if self.symbols.entry is not None:
+                self.execute_chapter(self.symbols.entry)
+        finally:
+            self.output.flush()
+            self.input_func, self.output.stream = saved
+        return self.variables
+    
+    def shell_mode(self):
+        """Интерактивный режим оболочки"""
+        self.clear_screen()
+        print("=" * 60)
+        print("ZeroShell 0.10 - Интерпретатор ZeroBasics")
+        print("=" * 60)
+        print("Введите !Help для справки")
+        print("-" * 60)
+        
+        while True:
+            try:
+                # Показываем текущую директорию скриптов
+                scripts = self.catalog().refresh()
+                if scripts.exists:
+                    prompt = f"ZB[{len(scripts.files)} скриптов]> "
+                else:
+                    prompt = "ZB[нет папки Scripts]> "
+                
+                cmd = input(prompt).strip()
+                
+                if not cmd:
+                    continue
+                
+                # Команды оболочки
+                if cmd.lower() == "!exit":
+                    print("Выход из ZeroShell...")
+                    break
+                
+                elif cmd.lower() == "!help":
+                    print("\n" + "=" * 60)
+                    print("КОМАНДЫ ZEROSHELL:")
+                    print("=" * 60)
+                    print("!Run <script>    - Запустить скрипт")
+                    print("!List            - Список скриптов")
+                    print("!New <name>      - Создать новый скрипт")
+                    print("!Edit <script>   - Редактировать скрипт")
+                    print("!Clear           - Очистить экран")
+                    print("!Dir             - Показать папку скриптов")
+                    print("!Debug           - Вкл/выкл отладочные сообщения")
+                    print("!Watch           - Вкл/выкл обновление глав при изменении скрипта")
+                    print("!Native          - Вкл/выкл перевод глав в функции Python")
+                    print("!Memory          - Память глав и переменных последнего скрипта")
+                    print("!Dump <script>   - Показать скрипт после оптимизации")
+                    print("!Profile <script> - Запустить скрипт с профилированием")
+                    print("!Help            - Эта справка")
+                    print("!Exit            - Выход")
+                    print("=" * 60)
+                    print("\nСКРИПТЫ ХРАНЯТСЯ В ПАПКЕ: Scripts/")
+                    print("Пример: !Run calculator.txt")
+                    print("=" * 60)
+                
+                elif cmd.lower().startswith("!profile "):
+                    script_name = cmd[9:].strip()
+                    if script_name:
+                        profiler = self.enable_profiler()
+                        try:
+                            self.run_script(script_name)
+                        finally:
+                            self.disable_profiler()
+                        print("\n".join(profiler.report()))
+                    else:
+                        print("Укажите имя скрипта: !Profile myscript.txt")
+                
+                elif cmd.lower().startswith("!run "):
+                    script_name = cmd[5:].strip()
+                    if script_name:
+                        script_name = self.catalog().resolve(script_name) or script_name
+                        self.run_script(script_name)
+                        input("\nНажмите Enter чтобы продолжить...")
+                        self.clear_screen()
+                        print("ZeroShell 0.10 - Интерпретатор ZeroBasics")
+                        print("=" * 60)
+                    else:
+                        print("Укажите имя скрипта: !Run myscript.txt")
+                
+                elif cmd.lower() == "!list":
+                    print("\n" + "=" * 60)
+                    print("СКРИПТЫ В ПАПКЕ Scripts:")
+                    print("=" * 60)
+                    
+                    scripts = self.catalog().refresh()
+                    if not scripts.exists:
+                        print("Папка Scripts не найдена!")
+                        print("Создайте папку 'Scripts' в текущей директории.")
+                    else:
+                        txt_files = scripts.names()
+                        if txt_files:
+                            for i, file in enumerate(txt_files, 1):
+                                print(f"{i:3}. {file:30} ({scripts.size(file)} байт)")
+                        else:
+                            print("Нет скриптов. Создайте новый: !New myscript")
+                        print("=" * 60)
+                
+                elif cmd.lower().startswith("!new "):
+                    script_name = cmd[5:].strip()
+                    if script_name:
+                        if not script_name.endswith('.txt'):
+                            script_name += '.txt'
+                        
+                        filepath = os.path.join(self.script_dir, script_name)
+                        if os.path.exists(filepath):
+                            print(f"Скрипт {script_name} уже существует!")
+                        else:
+                            # Создаем шаблон скрипта
+                            template = """Chp main
+Print {Добро пожаловать в программу!}
+Print Nline {Это ваш новый скрипт.}
+Input $name - {Введите ваше имя: }
+Print {Привет, } $name {!}
+Wait 2
+End Chp"""
+                            
+                            os.makedirs(self.script_dir, exist_ok=True)
+                            with open(filepath, 'w', encoding='utf-8') as f:
+                                f.write(template)
+                            self.catalog().invalidate()
+                            print(f"Создан новый скрипт: {script_name}")
+                            print(f"Путь: {filepath}")
+                    else:
+                        print("Укажите имя скрипта: !New myscript")
+                
+                elif cmd.lower().startswith("!edit "):
+                    script_name = cmd[6:].strip()
+                    if script_name:
+                        if not script_name.endswith('.txt'):
+                            script_name += '.txt'
+                        
+                        filepath = os.path.join(self.script_dir, script_name)
+                        if os.path.exists(filepath):
+                            print(f"Редактирование: {script_name}")
+                            print("Содержимое файла:")
+                            print("-" * 40)
+                            try:
+                                with open(filepath, 'r', encoding='utf-8') as f:
+                                    content = f.read()
+                                print(content)
+                            except:
+                                print("Не удалось прочитать файл")
+                            print("-" * 40)
+                            print("Используйте внешний редактор для редактирования.")
+                        else:
+                            print(f"Скрипт {script_name} не найден!")
+                    else:
+                        print("Укажите имя скрипта: !Edit myscript.txt")
+                
+                elif cmd.lower() == "!debug":
+                    self.debug = not self.debug
+                    print(f"Отладка {'включена' if self.debug else 'выключена'}")
+                
+                elif cmd.lower() == "!memory":
+                    print("\n".join(self.memory_report()))
+                
+                elif cmd.lower().startswith("!dump "):
+                    script_name = cmd[6:].strip()
+                    script_name = self.catalog().resolve(script_name) or script_name
+                    if self.load_script(script_name):
+                        print("\n".join(self.dump_program()))
+                
+                elif cmd.lower() == "!watch":
+                    self.watch = not self.watch
+                    print(f"Обновление глав {'включено' if self.watch else 'выключено'}")
+                
+                elif cmd.lower() == "!native":
+                    self.native = not self.native
+                    print(f"Перевод глав в функции Python {'включен' if self.native else 'выключен'}")
+                
+                elif cmd.lower() == "!clear":
+                    self.clear_screen()
+                    print("ZeroShell 0.10 - Интерпретатор ZeroBasics")
+                    print("=" * 60)
+                
+                elif cmd.lower() == "!dir":
+                    print("\n" + "=" * 60)
+                    print("ИНФОРМАЦИЯ О ПАПКЕ SCRIPTS:")
+                    print("=" * 60)
+                    scripts = self.catalog().refresh()
+                    if scripts.exists:
+                        abs_path = os.path.abspath(self.script_dir)
+                        print(f"Путь: {abs_path}")
+                        
+                        projects = self.catalog(os.path.join(self.script_dir, "projects"), None).refresh()
+                        
+                        print(f"Скриптов: {len(scripts.files)}")
+                        if projects.exists:
+                            print(f"Проектов: {len(projects.files)}")
+                        print("=" * 60)
+                    else:
+                        print("Папка Scripts не найдена!")
+                        print("Создайте папку 'Scripts' для хранения скриптов.")
+                        print("=" * 60)
+                
+                else:
+                    # Пробуем выполнить как команду ZeroBasics
+                    try:
+                        self.execute_command(cmd)
+                    finally:
+                        self.flush_files()
+                        self.output.flush()
+            
+            except KeyboardInterrupt:
+                print("\n\nВыход из ZeroShell...")
+                break
+            except Exception as e:
+                print(f"Ошибка: {e}")
+
+class Program:
+    """Скомпилированный скрипт ZeroBasics, не связанный с файлами.
+    
+    Компилируется один раз и выполняется сколько угодно раз, в том числе
+    одновременно в разных потоках: во время выполнения команды не меняются.
+    
+        program = Program.from_source("Print {Привет, } $name")
+        program.run({"name": "мир"}, output=chunks.append)
+    """
+    def __init__(self, chapters, symbols, name="<string>"):
+        self.chapters = chapters
+        self.symbols = symbols
+        self.name = name
+    
+    @classmethod
+    def from_source(cls, source, name="<string>"):
+        chapters, symbols = ZeroShell().parse_script(source.splitlines())
+        return cls(chapters, symbols, name)
+    
+    @property
+    def diagnostics(self):
+        return self.symbols.diagnostics
+    
+    def run(self, variables=None, input=None, output=None, shell=None):
+        """Выполняет программу в shell (по умолчанию - в новой оболочке для встраивания)"""
+        shell = shell or embedded_shell()
+        return shell.run_program(self, variables, input, output)
+    
+    def __repr__(self):
+        return f"Program({self.name!r}, {len(self.chapters)} глав)"
+
+def no_input(prompt):
+    """Input во встроенной оболочке без источника ответов"""
+    raise EOFError(f"нет ответа для Input: {prompt.strip()}")
+
+def embedded_shell():
+    """ZeroShell для встраивания: без кэша, цветов, терминала и вывода на экран"""
+    shell = ZeroShell()
+    shell.use_cache = False
+    shell.use_keyboard = False
+    shell.input_func = no_input
+    shell.output.colors = False
+    shell.output.stream = CallbackStream(lambda text: None)
+    return shell
+
+class ShellPool:
+    """Потокобезопасный пул заранее созданных оболочек для встраивания.
+    
+    Каждый вызов run берет свободную оболочку (или ждет ее), выполняет
+    программу и возвращает оболочку в пул. Программа общая, переменные
+    и вывод - свои у каждого вызова.
+    
+        pool = ShellPool(8)
+        variables = pool.run(program, {"x": 1}, output=send)
+    """
+    def __init__(self, size=4, factory=embedded_shell):
+        import threading
+        
+        self.size = size
+        self.factory = factory
+        self.condition = threading.Condition()
+        self.idle = [factory() for _ in range(size)]
+    
+    def acquire(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.idle, timeout):
+                raise TimeoutError("нет свободной оболочки в пуле")
+            return self.idle.pop()
+    
+    def release(self, shell):
+        shell.flush_files()
+        shell.variables = {}
+        with self.condition:
+            self.idle.append(shell)
+            self.condition.notify()
+    
+    def run(self, program, variables=None, input=None, output=None, timeout=None):
+        shell = self.acquire(timeout)
+        try:
+            return shell.run_program(program, variables, input, output)
+        finally:
+            self.release(shell)
+
+class ScriptServer:
+    """Сервер сеансов ZeroBasics на одном цикле asyncio.
+    
+    Каждое подключение (TCP или Unix-сокет, построчный протокол как у
+    telnet) - отдельный сеанс со своей оболочкой и переменными, а
+    скомпилированная программа общая. Сеанс, который ждет ответа на Input
+    или конца Wait, не занимает ни поток, ни процессор: выполнение
+    приостанавливается и продолжается через ZeroShell.resume. Долгие
+    вычисления каждые step_limit переходов и повторов уступают цикл другим
+    сеансам. Если клиент не успевает читать вывод, сеанс ждет на drain;
+    сеанс без ввода или клиент, не читающий вывод дольше idle_timeout
+    секунд, закрывается.
+    """
+    def __init__(self, program, project_dir=None, idle_timeout=600, max_output=1 << 16, max_line=1 << 12, step_limit=1000):
+        self.program = program
+        self.project_dir = project_dir
+        self.idle_timeout = idle_timeout
+        self.max_output = max_output  # байт в буфере сокета, после которых сеанс ждет клиента
+        self.max_line = max_line      # самая длинная строка ввода
+        self.step_limit = step_limit  # переходов и повторов сеанса между передачами управления
+        self.backlog = 1024           # очередь подключений, еще не принятых сервером
+        self.sessions = 0
+        self.server = None
+    
+    def session_shell(self, writer):
+        shell = embedded_shell()
+        shell.project_dir = self.project_dir
+        shell.input_lines = deque()
+        shell.step_limit = shell.steps_left = self.step_limit
+        transport = writer.transport
+        
+        def send(text):
+            writer.write(text.replace("\n", "\r\n").encode('utf-8'))
+            if transport.get_write_buffer_size() > self.max_output:
+                shell.output_full = True
+        shell.output.stream = CallbackStream(send)
+        return shell
+    
+    async def handle(self, reader, writer):
+        asyncio = self.asyncio
+        shell = self.session_shell(writer)
+        self.sessions += 1
+        try:
+            shell.use_program(self.program)
+            result = shell.execute_chapter(self.program.symbols.entry) if self.program.symbols.entry else True
+            while result is None:
+                await asyncio.wait_for(writer.drain(), self.idle_timeout)
+                shell.output_full = False
+                reason, value = shell.suspended
+                if reason == "input":
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                    if not line:
+                        return
+                    shell.input_lines.append(line.decode('utf-8', 'replace').rstrip('\r\n'))
+                elif reason == "wait":
+                    await asyncio.sleep(value)
+                elif reason == "yield":
+                    await asyncio.sleep(0)
+                result = shell.resume()
+            await asyncio.wait_for(writer.drain(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            if writer.transport.get_write_buffer_size() > self.max_output:
+                # Клиент не читает вывод: буфер не сбрасываем, соединение обрывается
+                writer.transport.abort()
+            else:
+                writer.write(f"Сеанс закрыт: нет ввода {self.idle_timeout} с\r\n".encode('utf-8'))
+        except (ConnectionError, ValueError):
+            pass
+        except Exception as e:
+            writer.write(f"Ошибка: {e}\r\n".encode('utf-8'))
+        finally:
+            self.sessions -= 1
+            shell.close_readers()
+            # Ожидание фоновой записи файлов не должно останавливать цикл
+            errors = await asyncio.get_running_loop().run_in_executor(None, shell.files.close)
+            for error in errors:
+                print(f"Ошибка записи файла: {error}")
+            writer.close()
+    
+    async def serve(self, address):
+        """address - host:port или unix:путь к сокету"""
+        # asyncio нужен только серверу
+        import asyncio
+        self.asyncio = asyncio
+        if address.startswith("unix:"):
+            self.server = await asyncio.start_unix_server(
+                self.handle, address[5:], limit=self.max_line, backlog=self.backlog)
+        else:
+            host, _, port = address.rpartition(":")
+            self.server = await asyncio.start_server(
+                self.handle, host or "127.0.0.1", int(port), limit=self.max_line, backlog=self.backlog)
+        async with self.server:
+            await self.server.serve_forever()
+    
+    def run(self, address):
+        import asyncio
+        try:
+            asyncio.run(self.serve(address))
+        except KeyboardInterrupt:
+            pass
+
+def run_batch_job(filepath, settings=None):
+    """Выполняет один скрипт пакетного запуска (в отдельном процессе).
+    
+    Ответы для Input берутся из записи <имя>.replay или из файла
+    <имя>.answers рядом со скриптом (по одному на строку). Если есть
+    <имя>.expected, вывод скрипта сравнивается с ним. settings - атрибуты
+    оболочки из параметров запуска: use_cache, optimize, native.
+    """
+    import contextlib
+    
+    base = os.path.splitext(filepath)[0]
+    if os.path.exists(base + ".replay"):
+        answers = Replay.from_file(base + ".replay")
+    elif os.path.exists(base + ".answers"):
+        with open(base + ".answers", 'r', encoding='utf-8') as f:
+            answers = f.read().splitlines()
+    else:
+        answers = []
+    
+    captured = io.StringIO()
+    shell = ZeroShell()
+    for name, value in (settings or {}).items():
+        setattr(shell, name, value)
+    shell.script_dir = os.path.dirname(filepath) or "."
+    shell.start_replay(answers)
+    started = time.perf_counter()
+    passed = False
+    with contextlib.redirect_stdout(captured):
+        try:
+            if not shell.load_script(os.path.basename(filepath)):
+                reason = "ошибка загрузки"
+            elif not shell.chapters:
+                reason = "нет команд"
+            else:
+                finished = shell.execute_chapter(shell.symbols.entry)
+                if finished is False and not shell.should_exit:
+                    reason = shell.error or "выполнение прервано"
+                else:
+                    reason = "exit" if shell.should_exit else "конец"
+                    passed = True
+        except (EOFError, ValueError) as e:
+            reason = str(e)
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}"
+        finally:
+            shell.output.flush()
+    elapsed = time.perf_counter() - started
+    
+    output = captured.getvalue()
+    if passed and os.path.exists(base + ".expected"):
+        with open(base + ".expected", 'r', encoding='utf-8') as f:
+            if f.read() != output:
+                passed = False
+                reason = "вывод отличается от .expected"
+    
+    return {
+        "script": filepath,
+        "passed": passed,
+        "reason": reason,
+        "time": elapsed,
+        "output": output,
+    }
+
+def run_batch(target, jobs=None, log_dir=None, json_path=None, settings=None):
+    """Пакетный запуск скриптов из папки или по маске в пуле процессов"""
+    import glob
+    from concurrent.futures import ProcessPoolExecutor
+    
+    if os.path.isdir(target):
+        files = sorted(glob.glob(os.path.join(target, "*.txt")))
+    else:
+        files = sorted(glob.glob(target))
+    if not files:
+        print(f"Не найдено скриптов: {target}")
+        return []
+    
+    print(f"Пакетный запуск: {len(files)} скриптов")
+    print("=" * 60)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for result in pool.map(run_batch_job, files, [settings] * len(files)):
+            results.append(result)
+            status = "OK" if result["passed"] else "FAIL"
+            name = os.path.basename(result["script"])
+            print(f"{status:4} {name:30} {result['reason']:32} {result['time']:8.3f} с")
+            
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+                log_path = os.path.join(log_dir, os.path.splitext(name)[0] + ".log")
+                with open(log_path, 'w', encoding='utf-8') as f:
+                    f.write(result["output"])
+    
+    failed = sum(1 for result in results if not result["passed"])
+    print("=" * 60)
+    print(f"Успешно: {len(results) - failed}, с ошибками: {failed}")
+    
+    if json_path:
+        import json
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return results
+
+def parse_options(argv):
+    """Разбирает аргументы вида --ключ, --ключ=значение и имена скриптов"""
+    options = {}
+    args = []
+    for arg in argv:
+        if arg.startswith("--"):
+            name, _, value = arg[2:].partition("=")
+            options[name] = value or True
+        else:
+            args.append(arg)
+    return options, args
+
+def create_scripts_folder():
+    """Папка Scripts с примером скрипта для первого запуска оболочки.
+    
+    Запуск скрипта из командной строки папок не создает: папка проекта
+    появляется при первом save, остальные - когда они нужны.
+    """
+    if not os.path.exists("Scripts"):
+        os.makedirs("Scripts", exist_ok=True)
+        print("Создана папка 'Scripts' для ваших скриптов")
+        print("Скрипты должны быть в формате .txt")
+        
+        # Создаем пример скрипта
+        example_script = """Chp main
+Print {Тестовый скрипт ZeroShell}
+Print Nline {Демонстрация работы}
+Print Col green {Зеленый текст}
+Print Nline Col red {Красный текст на новой строке}
+Input $name - {Введите ваше имя: }
+Print {Привет, } $name {!}
+Wait 1
+Print Nline {Спасибо за использование ZeroShell!}
+End Chp"""
+        
+        with open(os.path.join("Scripts", "test.txt"), 'w', encoding='utf-8') as f:
+            f.write(example_script)
+        print("Создан пример скрипта: Scripts/test.txt")
+    
+    # Создаем папку projects внутри Scripts
+    projects_dir = os.path.join("Scripts", "projects")
+    if not os.path.exists(projects_dir):
+        os.makedirs(projects_dir, exist_ok=True)
+
+def main():
+    """Главная функция"""
+    options, args = parse_options(sys.argv[1:])
+    
+    # Пакетный запуск: --batch=<папка или маска> [--jobs=N] [--log-dir=папка] [--json=файл]
+    # [--native] [--no-optimize] [--no-cache] - как при обычном запуске
+    if options.get("batch"):
+        jobs = int(options["jobs"]) if options.get("jobs") else None
+        settings = {
+            "use_cache": not options.get("no-cache"),
+            "optimize": not options.get("no-optimize"),
+            "native": bool(options.get("native")),
+        }
+        results = run_batch(options["batch"], jobs, options.get("log-dir"), options.get("json"), settings)
+        sys.exit(0 if results and all(result["passed"] for result in results) else 1)
+    
+    shell = ZeroShell()
+    
+    # Проверяем аргументы командной строки
+    shell.debug = bool(options.get("debug"))
+    shell.use_cache = not options.get("no-cache")
+    shell.lazy = bool(options.get("lazy"))
+    shell.watch = bool(options.get("watch"))
+    shell.use_keyboard = not options.get("no-keys")
+    shell.optimize = not options.get("no-optimize")
+    shell.native = bool(options.get("native"))
+    
+    # Дамп скрипта после оптимизации без запуска: --dump script
+    if options.get("dump") and args:
+        if not shell.load_script(args[0]):
+            sys.exit(1)
+        print("\n".join(shell.dump_program()))
+        return
+    
+    # Воспроизведение (--replay=файл) и запись (--record=файл) сеанса
+    if options.get("replay"):
+        shell.start_replay(Replay.from_file(options["replay"]))
+    if options.get("record"):
+        shell.start_recording(options["record"])
+    
+    # Профилирование: --profile[=сортировка] [--profile-out=файл.folded]
+    if options.get("profile"):
+        shell.enable_profiler()
+    
+    # Сервер сеансов: --serve=127.0.0.1:7070 (или unix:путь) script [--idle-timeout=секунды]
+    if options.get("serve") and args:
+        # Функции --native не умеют приостанавливаться посреди участка
+        shell.native = False
+        if not shell.load_script(args[0]):
+            sys.exit(1)
+        program = Program(shell.chapters, shell.symbols, args[0])
+        idle_timeout = float(options.get("idle-timeout") or 600)
+        server = ScriptServer(program, shell.project_dir, idle_timeout)
+        print(f"Сервер {args[0]}: {options['serve']} (Ctrl+C - остановить)")
+        server.run(options["serve"])
+        return
+    
+    if args:
+        # Запуск скрипта напрямую
+        script_name = args[0]
+        try:
+            shell.run_script(script_name)
+        finally:
+            if shell.recorder is not None:
+                shell.recorder.close()
+            if shell.profiler is not None:
+                sort = options["profile"] if options["profile"] in Profiler.SORT_KEYS else "self"
+                print("\n".join(shell.profiler.report(sort)))
+                if options.get("profile-out"):
+                    shell.profiler.write_collapsed(options["profile-out"])
+                    print(f"Стеки для flame graph: {options['profile-out']}")
+            if options.get("memory"):
+                print("\n".join(shell.memory_report()))
+        
+        # Ждем нажатия Enter перед выходом
+        if os.name == 'nt' and shell.replay is None:
+            input("\nНажмите Enter для выхода...")
+    else:
+        # Запускаем интерактивный режим
+        create_scripts_folder()
+        shell.shell_mode()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file